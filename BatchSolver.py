@@ -0,0 +1,255 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import GausZaidelJacobi
+from MatrixUtility import LUFactorization, SingularPivot
+
+CONVERGED = "converged"
+SINGULAR = "singular"
+MAX_ITERATIONS = "max_iterations"
+FAILED = "failed"
+
+# x is the solution (nan when there is none), iterations is None for the direct solve
+BatchResult = namedtuple("BatchResult", ["x", "status", "iterations"])
+
+# Methods with a vectorized solve of a whole stack of same-size systems
+STACKED_METHODS = ("lu", "jacobi", "gauss_seidel")
+
+# Estimated operations of a stack (m n^3 for LU, m n^2 per iteration otherwise) below which workers=None
+# solves it in this process - starting a pool and sharing the arrays costs about 0.1 s
+PARALLEL_MIN_WORK = 10 ** 7
+
+
+def solve_batch(problems, method="lu", tolerance=0.00001, max_iterations=100, workers=None, chunk_size=None,
+                stack_limit=64, **options):
+    """
+    Solve many independent systems Ax=b
+    Problems of the same size are stacked into one array, which is placed in shared memory and split into
+    chunks across a process pool, the workers write the solutions into a shared output array. Systems of
+    size <= stack_limit are solved as whole stacks with vectorized updates, larger ones one by one.
+    :param problems: Stacked arrays (A of shape m x n x n, b of shape m x n), or an iterable of (A, b) pairs
+    :param method: "lu" for the pivoted LU solve, or a key of GausZaidelJacobi.ITERATIVE_METHODS
+    :param tolerance: Iterative methods converge when ||b-Ax||inf <= tolerance * ||b||inf
+    :param max_iterations: Iteration limit of the iterative methods
+    :param workers: Number of processes, None for one per CPU once a stack reaches PARALLEL_MIN_WORK,
+                    1 solves in this process
+    :param chunk_size: Problems per task, by default about four tasks per worker
+    :param stack_limit: Largest system size solved as a stack
+    :param options: Extra keyword arguments of the iterative method (omega, preconditioner...)
+    :return: List of BatchResult(x, status, iterations) in the order of the problems
+    """
+    if method != "lu" and method not in GausZaidelJacobi.ITERATIVE_METHODS:
+        raise ValueError(f"Unknown method {method!r}, use 'lu' or one of {list(GausZaidelJacobi.ITERATIVE_METHODS)}.")
+    groups = _group_by_size(problems)
+    total = sum(len(order) for order, _, _ in groups)
+    automatic = workers is None
+    workers = (os.cpu_count() or 1) if automatic else workers
+    settings = (method, tolerance, max_iterations, stack_limit, options)
+
+    results = [None] * total
+    for order, A, B in groups:
+        m, n = B.shape
+        work = m * n ** 3 if method == "lu" else m * n ** 2 * max_iterations
+        if workers <= 1 or m == 1 or (automatic and work < PARALLEL_MIN_WORK):
+            X = np.empty(B.shape)
+            status, iterations = _solve_block(A, B, X, settings)
+        else:
+            X, status, iterations = _solve_shared(A, B, settings, workers, chunk_size)
+        for position, x, state, count in zip(order, X, status, iterations):
+            results[position] = BatchResult(x, state, count)
+    return results
+
+
+def _group_by_size(problems):
+    """
+    :return: List of (positions in the input, A stack, b stack), one entry per system size
+    """
+    # Only an array is taken as a stack, a tuple of two (A, b) pairs is not coerced into one
+    if (isinstance(problems, tuple) and len(problems) == 2 and isinstance(problems[0], np.ndarray)
+            and problems[0].ndim == 3):
+        A = problems[0].astype(float, copy=False)
+        B = np.asarray(problems[1], dtype=float).reshape(len(A), -1)
+        return [(np.arange(len(A)), A, B)]
+    by_size = {}
+    for position, (A, b) in enumerate(problems):
+        A = np.asarray(A, dtype=float)
+        by_size.setdefault(len(A), []).append((position, A, np.asarray(b, dtype=float).reshape(-1)))
+    return [(np.array([p for p, _, _ in group]), np.stack([A for _, A, _ in group]), np.stack([b for _, _, b in group]))
+            for group in by_size.values()]
+
+
+def _solve_shared(A, B, settings, workers, chunk_size):
+    m = len(A)
+    chunk_size = chunk_size or max(1, -(-m // (4 * workers)))
+    blocks = [shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1)) for array in (A, B, B)]
+    try:
+        spec = [(block.name, array.shape) for block, array in zip(blocks, (A, B, B))]
+        np.ndarray(A.shape, buffer=blocks[0].buf)[:] = A
+        np.ndarray(B.shape, buffer=blocks[1].buf)[:] = B
+        status, iterations = [None] * m, [None] * m
+        with ProcessPoolExecutor(min(workers, -(-m // chunk_size))) as pool:
+            tasks = [pool.submit(_solve_chunk, spec, start, min(start + chunk_size, m), settings)
+                     for start in range(0, m, chunk_size)]
+            for task in tasks:
+                start, chunk_status, chunk_iterations = task.result()
+                status[start:start + len(chunk_status)] = chunk_status
+                iterations[start:start + len(chunk_iterations)] = chunk_iterations
+        X = np.ndarray(B.shape, buffer=blocks[2].buf).copy()
+        return X, status, iterations
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _solve_chunk(spec, start, stop, settings):
+    # Runs in a worker - attaches to the shared arrays by name, only the statuses travel back by pickle
+    blocks = [shared_memory.SharedMemory(name=name) for name, _ in spec]
+    try:
+        A, B, X = (np.ndarray(shape, buffer=block.buf) for block, (_, shape) in zip(blocks, spec))
+        status, iterations = _solve_block(A[start:stop], B[start:stop], X[start:stop], settings)
+        del A, B, X
+        return start, status, iterations
+    finally:
+        for block in blocks:
+            block.close()
+
+
+def _solve_block(A, B, X, settings):
+    """
+    Solve the stack A[k] X[k] = B[k], writing X in place
+    :return: (list of statuses, list of iteration counts)
+    """
+    method, tolerance, max_iterations, stack_limit, options = settings
+    n = B.shape[1]
+    if n <= stack_limit and method in STACKED_METHODS and not options:
+        if method == "lu":
+            X[:], singular = stacked_lu_solve(A, B)
+            return [SINGULAR if s else CONVERGED for s in singular], [None] * len(B)
+        return stacked_iterative_solve(A, B, X, method, tolerance, max_iterations)
+
+    status, iterations = [], []
+    for k in range(len(B)):
+        state, count = _solve_one(A[k], B[k], X[k], method, tolerance, max_iterations, options)
+        status.append(state)
+        iterations.append(count)
+    return status, iterations
+
+
+def _solve_one(A, b, x, method, tolerance, max_iterations, options):
+    if method == "lu":
+        factorization = LUFactorization(A)
+        if factorization.is_singular():
+            x[:] = np.nan
+            return SINGULAR, None
+        x[:] = factorization.solve(b)
+        return CONVERGED, None
+    try:
+        history, iterations = GausZaidelJacobi.solve_iterative(method, A, b, tolerance, max_iterations,
+                                                               criterion="residual", history="last", **options)
+    except np.linalg.LinAlgError:
+        # e.g. a GMRES breakdown on a singular matrix
+        x[:] = np.nan
+        return SINGULAR, 0
+    except ValueError:
+        # e.g. a zero on the diagonal
+        x[:] = np.nan
+        return FAILED, 0
+    x[:] = history.values[-1]
+    converged = history.residuals[-1] <= tolerance * np.max(np.abs(b), initial=0)
+    return (CONVERGED if converged else MAX_ITERATIONS), iterations
+
+
+def stacked_lu_solve(A, B):
+    """
+    Partial-pivot LU solve of a stack of systems, every elimination step is one vectorized update of all of them
+    :param A: m x n x n stack of matrices
+    :param B: m x n stack of right-hand sides
+    :return: (m x n solutions, boolean array of the singular systems) - a singular system has a nan solution,
+             singular by the pivot rule of MatrixUtility.IsSingularLU
+    """
+    U = np.array(A, dtype=float)
+    Y = np.array(B, dtype=float)
+    m, n = Y.shape
+    problems = np.arange(m)
+    # Largest entry of every row, swapped along with the rows
+    scale = np.max(np.abs(U), axis=2, initial=0)
+    for k in range(n):
+        pivot_rows = k + np.argmax(np.abs(U[:, k:, k]), axis=1)
+        row_k = U[problems, k].copy()
+        U[problems, k] = U[problems, pivot_rows]
+        U[problems, pivot_rows] = row_k
+        y_k = Y[:, k].copy()
+        Y[:, k] = Y[problems, pivot_rows]
+        Y[problems, pivot_rows] = y_k
+        scale_k = scale[:, k].copy()
+        scale[:, k] = scale[problems, pivot_rows]
+        scale[problems, pivot_rows] = scale_k
+        # An exact zero pivot only stops the division, the system is flagged below
+        pivots = np.where(U[:, k, k] == 0, 1.0, U[:, k, k])
+        factors = U[:, k + 1:, k] / pivots[:, None]
+        U[:, k + 1:, k:] -= factors[:, :, None] * U[:, None, k, k:]
+        Y[:, k + 1:] -= factors * Y[:, k, None]
+
+    diagonal = np.diagonal(U, axis1=1, axis2=2)
+    singular = np.any(SingularPivot(diagonal, scale, n), axis=1)
+    safe = np.where(singular[:, None], 1.0, diagonal)
+    for k in range(n - 1, -1, -1):
+        Y[:, k] = (Y[:, k] - np.einsum("ij,ij->i", U[:, k, k + 1:], Y[:, k + 1:])) / safe[:, k]
+    Y[singular] = np.nan
+    return Y, singular
+
+
+def stacked_iterative_solve(A, B, X, method="jacobi", tolerance=0.00001, max_iterations=100):
+    """
+    Jacobi or Gauss-Seidel on a stack of systems at once, each system stops on its own when
+    ||b-Ax||inf <= tolerance * ||b||inf
+    :param A: m x n x n stack of matrices
+    :param B: m x n stack of right-hand sides
+    :param X: m x n output array
+    :param method: "jacobi" or "gauss_seidel"
+    :return: (list of statuses, list of iteration counts)
+    """
+    m, n = B.shape
+    d = np.diagonal(A, axis1=1, axis2=2)
+    failed = np.any(d == 0, axis=1)
+    limit = tolerance * np.max(np.abs(B), axis=1, initial=0)
+    X[:] = 0.0
+    iterations = np.zeros(m, dtype=int)
+    converged = np.zeros(m, dtype=bool)
+    active = np.flatnonzero(~failed)
+    residual = B - np.einsum("kij,kj->ki", A, X)
+    for iteration in range(1, max_iterations + 1):
+        if len(active) == 0:
+            break
+        a, b, x = A[active], B[active], X[active]
+        if method == "jacobi":
+            x += residual[active] / d[active]
+        else:
+            for i in range(n):
+                x[:, i] += (b[:, i] - np.einsum("ij,ij->i", a[:, i], x)) / d[active, i]
+        r = b - np.einsum("kij,kj->ki", a, x)
+        X[active], residual[active] = x, r
+        iterations[active] = iteration
+        done = np.max(np.abs(r), axis=1) <= limit[active]
+        converged[active[done]] = True
+        active = active[~done]
+
+    X[failed] = np.nan
+    status = np.where(failed, FAILED, np.where(converged, CONVERGED, MAX_ITERATIONS))
+    return status.tolist(), iterations.tolist()
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    matrices = rng.uniform(-1, 1, (10000, 4, 4)) + 4 * np.identity(4)
+    vectors = rng.uniform(-1, 1, (10000, 4))
+    matrices[1] = [[1, 2, 0, 0], [2, 4, 0, 0], [0, 0, 1, 0], [0, 0, 0, 1]]
+    for name in ("lu", "gauss_seidel"):
+        results = solve_batch((matrices, vectors), name, tolerance=1e-10, workers=1)
+        counts = {state: sum(r.status == state for r in results) for state in (CONVERGED, SINGULAR, MAX_ITERATIONS)}
+        print(f"{name}: {counts}, first solution {results[0].x}")
@@ -0,0 +1,477 @@
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+import FindingRoots
+import GausZaidelJacobi
+import LinearPolenomiyal
+import MatrixUtility
+import NevileLagrange
+import Splaine
+from MatrixUtility import CofactorDeterminant, LUDeterminant
+
+
+# ----------------------------------------------------------------- problem generators
+
+def diagonally_dominant_matrix(n, rng, margin=1.0):
+    """
+    Random strictly diagonally dominant matrix with its right-hand side
+    :param n: Matrix size
+    :param rng: numpy Generator
+    :param margin: |a_ii| = (1 + margin) * sum of the other |a_ij| in row i
+    :return: (A, b)
+    """
+    A = rng.uniform(-1, 1, (n, n))
+    np.fill_diagonal(A, 0)
+    np.fill_diagonal(A, (1 + margin) * np.sum(np.abs(A), axis=1) + 1)
+    return A, rng.uniform(-1, 1, n)
+
+
+def spd_matrix(n, rng, condition=100.0):
+    """
+    Random symmetric positive definite matrix with a prescribed 2-norm condition number
+    :param n: Matrix size
+    :param rng: numpy Generator
+    :param condition: Ratio of the largest to the smallest eigenvalue
+    :return: (A, b)
+    """
+    Q, _ = np.linalg.qr(rng.standard_normal((n, n)))
+    eigenvalues = np.geomspace(1, condition, n)
+    return (Q * eigenvalues) @ Q.T, rng.uniform(-1, 1, n)
+
+
+def vandermonde_matrix(n, rng):
+    """
+    Vandermonde matrix of n sorted random nodes in [-1, 1], row i is [1, x_i, x_i^2, ...]
+    :return: (A, b)
+    """
+    x = np.sort(rng.uniform(-1, 1, n))
+    return np.vander(x, increasing=True), rng.uniform(-1, 1, n)
+
+
+def smooth_dataset(n, rng, start=0.0, end=10.0):
+    """
+    n sorted, distinct abscissae in [start, end] with the values of a smooth function
+    :return: (x, y)
+    """
+    x = np.sort(rng.uniform(start, end, n))
+    x[0], x[-1] = start, end
+    x = np.maximum.accumulate(x + np.arange(n) * 1e-9)
+    return x, np.sin(x) + 0.5 * np.cos(3 * x) / (1 + x * x)
+
+
+def chebyshev_dataset(n, rng):
+    """
+    Smooth values at the n Chebyshev nodes of [-1, 1] - the well-conditioned case of polynomial interpolation,
+    the random phase keeps the data seeded
+    :return: (x, y)
+    """
+    x = np.cos(np.pi * (np.arange(n) + 0.5) / n)[::-1]
+    return x, np.sin(3 * x + rng.uniform(0, np.pi)) / (1 + x * x)
+
+
+def polynomial_with_roots(k, rng):
+    """
+    Polynomial with k known real roots, one in each unit cell [i - 0.5, i + 0.5]
+    :return: (coefficients from the highest power, roots, brackets) - brackets[i] encloses roots[i] only
+    """
+    roots = np.arange(k) + rng.uniform(-0.3, 0.3, k)
+    brackets = np.column_stack((np.arange(k) - 0.5, np.arange(k) + 0.5))
+    return np.poly(roots), roots, brackets
+
+
+class CountingFunction:
+    """
+    Wrapper that counts the evaluations of a function, an array argument counts once per element
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.evaluations = 0
+
+    def __call__(self, x):
+        self.evaluations += np.size(x)
+        return self.func(x)
+
+
+# ----------------------------------------------------------------- measurement
+
+def time_call(func, *args, repeats=3):
+    """
+    Best wall time of several calls
+    :param func: Function to time
+    :param args: Arguments passed to func
+    :param repeats: Number of calls
+    :return: (best time in seconds, result of the last call)
+    """
+    best = np.inf
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peak_memory(func, *args):
+    """
+    Peak of the memory allocated during one call, measured by tracemalloc (numpy arrays included)
+    :return: (peak in bytes, result of the call)
+    """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        result = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, result
+
+
+# A benchmark case: setup(n, rng) builds the arguments of run, when count names a counter
+# (iterations, evaluations) run(*args) returns its value, otherwise the result of run is ignored
+BenchmarkCase = namedtuple("BenchmarkCase", ["name", "sizes", "setup", "run", "count"])
+
+
+def _iterative_case(name, method, generator, sizes, **options):
+    def run(A, b):
+        _, iterations = method(A, b, 1e-8, 10000, criterion="residual", history="none", **options)
+        return iterations
+    return BenchmarkCase(name, sizes, lambda n, rng: generator(n, rng), run, "iterations")
+
+
+def _root_case(name, finder, sizes):
+    def setup(k, rng):
+        coefficients, roots, brackets = polynomial_with_roots(k, rng)
+        return CountingFunction(lambda x: np.polyval(coefficients, x)), brackets
+
+    def run(func, brackets):
+        func.evaluations = 0
+        for a, b in brackets:
+            finder(func, a, b)
+        return func.evaluations
+    return BenchmarkCase(name, sizes, setup, run, "evaluations")
+
+
+def _neville_points(n, rng):
+    x, y = chebyshev_dataset(n, rng)
+    return x, y, rng.uniform(-1, 1)
+
+
+def _spline_points(n, rng):
+    x, y = smooth_dataset(n, rng)
+    return x, y, rng.uniform(0, 10, 100000), 0.0, 0.0
+
+
+def _polynomial_root_derivative(k, rng):
+    coefficients, roots, _ = polynomial_with_roots(k, rng)
+    derivative = np.polyder(coefficients)
+    return (CountingFunction(lambda x: np.polyval(coefficients, x)), lambda x: np.polyval(derivative, x),
+            roots + 0.1)
+
+
+def _newton_run(func, derivative, guesses):
+    func.evaluations = 0
+    for guess in guesses:
+        FindingRoots.newton_raphson_method(func, derivative, guess, 1e-12, 100)
+    return func.evaluations
+
+
+def _scan_run(func, start, end):
+    func.evaluations = 0
+    FindingRoots.scan_intervals(func, start, end, 100001)
+    return func.evaluations
+
+
+CASES = [
+    BenchmarkCase("MatrixUtility.Determinant", [10, 50, 200, 500],
+                  lambda n, rng: (rng.uniform(-1, 1, (n, n)), 1), MatrixUtility.Determinant, None),
+    BenchmarkCase("MatrixUtility.InverseMatrix", [10, 50, 200, 500],
+                  lambda n, rng: (diagonally_dominant_matrix(n, rng)[0],),
+                  lambda A: MatrixUtility.InverseMatrix(A), None),
+    BenchmarkCase("MatrixUtility.LUFactorization.solve", [10, 50, 200, 500],
+                  lambda n, rng: diagonally_dominant_matrix(n, rng),
+                  lambda A, b: MatrixUtility.LUFactorization(A).solve(b), None),
+    BenchmarkCase("MatrixUtility.CondEstimate", [10, 50, 200, 500],
+                  lambda n, rng: (spd_matrix(n, rng, 1e6)[0],), MatrixUtility.CondEstimate, None),
+    BenchmarkCase("LinearPolenomiyal.solveMatrix", [10, 20, 40], vandermonde_matrix,
+                  lambda A, b: LinearPolenomiyal.solveMatrix(A, b), None),
+    _iterative_case("GausZaidelJacobi.jacobi_method", GausZaidelJacobi.jacobi_method,
+                    diagonally_dominant_matrix, [10, 100, 500]),
+    _iterative_case("GausZaidelJacobi.gauss_seidel_method", GausZaidelJacobi.gauss_seidel_method,
+                    diagonally_dominant_matrix, [10, 100, 500]),
+    _iterative_case("GausZaidelJacobi.sor_method", GausZaidelJacobi.sor_method,
+                    spd_matrix, [10, 100, 500]),
+    _iterative_case("GausZaidelJacobi.conjugate_gradient_method", GausZaidelJacobi.conjugate_gradient_method,
+                    spd_matrix, [10, 100, 500]),
+    _iterative_case("GausZaidelJacobi.gmres_method", GausZaidelJacobi.gmres_method,
+                    diagonally_dominant_matrix, [10, 100, 500]),
+    BenchmarkCase("LinearPolenomiyal.polynomialInterpolation", [10, 20, 40],
+                  lambda n, rng: (list(zip(*_neville_points(n, rng)[:2])), 0.3),
+                  lambda points, x: LinearPolenomiyal.polynomialInterpolation(points, x), None),
+    BenchmarkCase("LinearPolenomiyal.piecewiseLinear", [100, 10000, 1000000],
+                  lambda n, rng: _spline_points(n, rng)[:3],
+                  lambda x, y, points: LinearPolenomiyal.piecewiseLinear(x, y, points), None),
+    BenchmarkCase("NevileLagrange.lagrange_interpolation", [10, 100, 400], _neville_points,
+                  lambda x, y, point: NevileLagrange.lagrange_interpolation(x, y, point), None),
+    BenchmarkCase("NevileLagrange.neville", [10, 100, 400], _neville_points,
+                  lambda x, y, point: NevileLagrange.neville(x, y, point), None),
+    BenchmarkCase("NevileLagrange.neville_vectorized", [10, 100, 400],
+                  lambda n, rng: _neville_points(n, rng)[:2] + (rng.uniform(-1, 1, 1000),),
+                  lambda x, y, points: NevileLagrange.neville_vectorized(x, y, points), None),
+    BenchmarkCase("NevileLagrange.BarycentricInterpolator", [10, 100, 400],
+                  lambda n, rng: _neville_points(n, rng)[:2] + (rng.uniform(-1, 1, 1000),),
+                  lambda x, y, points: NevileLagrange.BarycentricInterpolator(x, y)(points), None),
+    BenchmarkCase("Splaine.spline_cubic", [100, 10000, 100000], _spline_points,
+                  lambda x, y, points, d0, dn: Splaine.spline_cubic(x, y, points, d0, dn), None),
+    BenchmarkCase("FindingRoots.scan_intervals", [4, 8, 12],
+                  lambda k, rng: (CountingFunction(np.poly1d(polynomial_with_roots(k, rng)[0])), -0.5, k - 0.5),
+                  _scan_run, "evaluations"),
+    _root_case("FindingRoots.bisection_method",
+               lambda f, a, b: FindingRoots.bisection_method(f, a, b, 1e-12), [4, 8, 12]),
+    _root_case("FindingRoots.secant_method",
+               lambda f, a, b: FindingRoots.secant_method(f, a, b, 1e-12), [4, 8, 12]),
+    _root_case("FindingRoots.hybrid_method",
+               lambda f, a, b: FindingRoots.hybrid_method(f, a, b, 1e-12), [4, 8, 12]),
+    BenchmarkCase("FindingRoots.newton_raphson_method", [4, 8, 12], _polynomial_root_derivative, _newton_run,
+                  "evaluations"),
+]
+
+
+def run_benchmarks(names=None, sizes=None, repeats=3, seed=0):
+    """
+    Time every benchmark case across its sweep of sizes
+    :param names: Names (or name prefixes, e.g. "FindingRoots") of the cases to run, None runs all
+    :param sizes: Sizes used for every case instead of their own sweeps
+    :param repeats: Timed calls per measurement, the best is kept
+    :param seed: Seed of the problem generators, each (case, size) gets its own stream
+    :return: {"meta": {...}, "results": [{name, size, time, peak_memory, count, count_name}, ...]}
+    """
+    results = []
+    for case in CASES:
+        if names is not None and not any(case.name == name or case.name.startswith(name + ".") for name in names):
+            continue
+        for n in (case.sizes if sizes is None else sizes):
+            rng = np.random.default_rng([seed, zlib.crc32(case.name.encode()), n])
+            args = case.setup(n, rng)
+            memory, count = peak_memory(case.run, *args)
+            elapsed, _ = time_call(case.run, *args, repeats=repeats)
+            results.append({"name": case.name, "size": n, "time": elapsed, "peak_memory": memory,
+                            "count": None if case.count is None else int(count), "count_name": case.count})
+    meta = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "seed": seed, "repeats": repeats,
+            "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine()}
+    return {"meta": meta, "results": results}
+
+
+def save_results(run, path):
+    with open(path, "w") as file:
+        json.dump(run, file, indent=1)
+
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare_runs(baseline, current, threshold=0.2, min_time=1e-3):
+    """
+    Compare two runs of run_benchmarks case by case
+    :param baseline: Earlier run (dict or path of a JSON file)
+    :param current: New run (dict or path of a JSON file)
+    :param threshold: Relative increase of time or peak memory that counts as a regression
+    :param min_time: Times below this (in seconds) in both runs are too noisy to flag
+    :return: List of rows {name, size, time_ratio, memory_ratio, count_change, regressions}
+    """
+    baseline = load_results(baseline) if isinstance(baseline, str) else baseline
+    current = load_results(current) if isinstance(current, str) else current
+    earlier = {(row["name"], row["size"]): row for row in baseline["results"]}
+    rows = []
+    for row in current["results"]:
+        old = earlier.get((row["name"], row["size"]))
+        if old is None:
+            continue
+        time_ratio = row["time"] / old["time"] if old["time"] > 0 else np.inf
+        memory_ratio = row["peak_memory"] / old["peak_memory"] if old["peak_memory"] > 0 else 1.0
+        count_change = None if row["count"] is None or old["count"] is None else row["count"] - old["count"]
+        regressions = []
+        if time_ratio > 1 + threshold and max(row["time"], old["time"]) >= min_time:
+            regressions.append("time")
+        if memory_ratio > 1 + threshold and row["peak_memory"] - old["peak_memory"] > 4096:
+            regressions.append("peak_memory")
+        # Counts are deterministic for a fixed seed, any increase is a regression
+        if count_change is not None and count_change > 0:
+            regressions.append(row["count_name"])
+        rows.append({"name": row["name"], "size": row["size"], "time_ratio": time_ratio,
+                     "memory_ratio": memory_ratio, "count_change": count_change, "regressions": regressions})
+    return rows
+
+
+def print_results(run):
+    print(f"{'case':<45} {'size':>8} {'time [s]':>11} {'peak [KiB]':>11} {'count':>10}")
+    for row in run["results"]:
+        count = "-" if row["count"] is None else f"{row['count']}"
+        print(f"{row['name']:<45} {row['size']:>8} {row['time']:>11.3e} {row['peak_memory'] / 1024:>11.1f} "
+              f"{count:>10}")
+
+
+def print_comparison(rows):
+    print(f"{'case':<45} {'size':>8} {'time':>8} {'memory':>8} {'count':>7}  regressions")
+    for row in rows:
+        count = "-" if row["count_change"] is None else f"{row['count_change']:+d}"
+        flag = ", ".join(row["regressions"]) if row["regressions"] else "-"
+        print(f"{row['name']:<45} {row['size']:>8} {row['time_ratio']:>7.2f}x {row['memory_ratio']:>7.2f}x "
+              f"{count:>7}  {flag}")
+
+
+def benchmark_determinant(sizes=range(2, 13), repeats=3, cofactor_limit=9, seed=0):
+    """
+    Compare the cofactor recursion against the LU determinant
+    :param sizes: Matrix sizes n
+    :param repeats: Calls per measurement
+    :param cofactor_limit: Largest n timed with the recursion, larger sizes are
+                           extrapolated as n * time(n-1) since the cost grows as O(n!)
+    :param seed: Seed of the random matrices
+    :return: List of rows {n, cofactor, cofactor_estimated, lu, difference}
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    cofactor_time = None
+    for n in sizes:
+        matrix = rng.uniform(-1, 1, (n, n))
+        lu_time, lu_det = time_call(LUDeterminant, matrix, repeats=repeats)
+        if n <= cofactor_limit:
+            cofactor_time, cofactor_det = time_call(CofactorDeterminant, matrix.tolist(), 1, repeats=repeats)
+            estimated = False
+            difference = abs(cofactor_det - lu_det)
+        else:
+            cofactor_time = cofactor_time * n
+            estimated = True
+            difference = None
+        rows.append({"n": n, "cofactor": cofactor_time, "cofactor_estimated": estimated,
+                     "lu": lu_time, "difference": difference})
+    return rows
+
+
+def _print_determinant_table():
+    print(f"{'n':>3} {'cofactor [s]':>14} {'LU [s]':>12} {'speedup':>12} {'|difference|':>14}")
+    for row in benchmark_determinant():
+        mark = "*" if row["cofactor_estimated"] else " "
+        difference = "-" if row["difference"] is None else f"{row['difference']:.2e}"
+        print(f"{row['n']:>3} {row['cofactor']:>13.3e}{mark} {row['lu']:>12.3e} "
+              f"{row['cofactor'] / row['lu']:>12.1f} {difference:>14}")
+    print("* extrapolated from the previous size")
+
+
+def check_hybrid_evaluations(trials=1000, seed=0, n0_values=(0, 1, 2)):
+    """
+    Compare the function evaluations of the hybrid method against the Bisection Method on random brackets
+    of random cubics and exponentials, with tolerances from 1e-12 to 1e-2
+    :param trials: Brackets per function
+    :param seed: Seed of the brackets
+    :param n0_values: Slack of the hybrid method, every value runs on the same brackets
+    :return: List of rows {function, n0, trials, hybrid, bisection, exceeded} - mean evaluations of both methods
+             and the number of brackets where the hybrid method needed more than bisection plus n0
+    """
+    # (name, function, its root)
+    functions = [("cubic", lambda x: x ** 3 - 2 * x - 5, 2.0945514815423265),
+                 ("exp", lambda x: np.exp(x) - 2, np.log(2))]
+    rows = []
+    for name, func, root in functions:
+        counted = CountingFunction(func)
+        rng = np.random.default_rng(seed)
+        cases = [(rng.uniform(-10, root), rng.uniform(root, 10), 10 ** rng.uniform(-12, -2)) for _ in range(trials)]
+        bisection = []
+        for a, b, tolerance in cases:
+            counted.evaluations = 0
+            FindingRoots.bisection_method(counted, a, b, tolerance)
+            bisection.append(counted.evaluations)
+        for n0 in n0_values:
+            hybrid = []
+            for a, b, tolerance in cases:
+                counted.evaluations = 0
+                FindingRoots.hybrid_method(counted, a, b, tolerance, n0=n0)
+                hybrid.append(counted.evaluations)
+            rows.append({"function": name, "n0": n0, "trials": trials, "hybrid": float(np.mean(hybrid)),
+                         "bisection": float(np.mean(bisection)),
+                         "exceeded": int(np.sum(np.array(hybrid) > np.array(bisection) + n0))})
+    return rows
+
+
+def _print_hybrid_check(rows):
+    print(f"{'function':<10} {'n0':>3} {'trials':>7} {'hybrid':>8} {'bisection':>10} {'exceeded':>9}")
+    for row in rows:
+        print(f"{row['function']:<10} {row['n0']:>3} {row['trials']:>7} {row['hybrid']:>8.2f} "
+              f"{row['bisection']:>10.2f} {row['exceeded']:>9}")
+
+
+def check_scan_intervals(num_points=10001):
+    """
+    Count the brackets scan_intervals returns on [0, 1] for functions with a known number of roots,
+    including functions without roots and a pair of roots closer than the grid spacing
+    :return: List of rows {function, expected, found}
+    """
+    # (name, function, number of roots on [0, 1])
+    functions = [("exp", np.exp, 0),
+                 ("parabola", lambda x: (x - 0.5) ** 2 + 1e-3, 0),
+                 ("close pair", lambda x: (x - 0.5) ** 2 - 1e-10, 2),
+                 ("sine", lambda x: np.sin(10 * np.pi * (x - 0.05)), 10)]
+    rows = []
+    for name, func, expected in functions:
+        found = FindingRoots.scan_intervals(func, 0.0, 1.0, num_points)
+        rows.append({"function": name, "expected": expected, "found": len(found)})
+    return rows
+
+
+def _print_scan_check(rows):
+    print(f"{'function':<12} {'expected':>9} {'found':>6}")
+    for row in rows:
+        print(f"{row['function']:<12} {row['expected']:>9} {row['found']:>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks of the numerical routines")
+    commands = parser.add_subparsers(dest="command")
+    run_parser = commands.add_parser("run", help="time the benchmark cases and write them as JSON")
+    run_parser.add_argument("output", nargs="?", help="JSON file for the results")
+    run_parser.add_argument("--names", nargs="+", help="cases or modules to run, e.g. FindingRoots")
+    run_parser.add_argument("--sizes", nargs="+", type=int, help="sizes used for every case")
+    run_parser.add_argument("--repeats", type=int, default=3)
+    run_parser.add_argument("--seed", type=int, default=0)
+    compare_parser = commands.add_parser("compare", help="compare two JSON runs and flag regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2)
+    commands.add_parser("determinant", help="cofactor against LU determinant table")
+    commands.add_parser("hybrid", help="check that the hybrid method never needs more evaluations than "
+                                         "bisection plus n0")
+    commands.add_parser("scan", help="check the number of brackets scan_intervals finds")
+    arguments = parser.parse_args()
+
+    if arguments.command == "run":
+        result = run_benchmarks(arguments.names, arguments.sizes, arguments.repeats, arguments.seed)
+        print_results(result)
+        if arguments.output:
+            save_results(result, arguments.output)
+    elif arguments.command == "compare":
+        comparison = compare_runs(arguments.baseline, arguments.current, arguments.threshold)
+        print_comparison(comparison)
+        if any(row["regressions"] for row in comparison):
+            raise SystemExit(1)
+    elif arguments.command == "hybrid":
+        checks = check_hybrid_evaluations()
+        _print_hybrid_check(checks)
+        if any(row["exceeded"] for row in checks):
+            raise SystemExit(1)
+    elif arguments.command == "scan":
+        checks = check_scan_intervals()
+        _print_scan_check(checks)
+        if any(row["found"] != row["expected"] for row in checks):
+            raise SystemExit(1)
+    else:
+        _print_determinant_table()
@@ -1,57 +1,217 @@
+import numpy as np
 import sympy as sp
+
+import Trace
+
+# Compiled (function, derivative) pairs of SymPy expressions, keyed by (expression, symbol, cse)
+_compiled_expressions = {}
+
+
+def compile_expression(expr, symbol=None, cse=True):
+    """
+    Compiles a SymPy expression and its symbolic derivative once into NumPy callables.
+    The pair is cached by expression, so later calls with an equal expression reuse it.
+    Returns (func, derivative).
+    """
+    if symbol is None:
+        symbols = expr.free_symbols
+        if len(symbols) != 1:
+            raise ValueError(f"Expected an expression of one variable, got the symbols {symbols}.")
+        symbol = next(iter(symbols))
+    key = (expr, symbol, cse)
+    if key not in _compiled_expressions:
+        _compiled_expressions[key] = (_lambdify(expr, symbol, cse), _lambdify(sp.diff(expr, symbol), symbol, cse))
+    return _compiled_expressions[key]
+
+
+def _lambdify(expr, symbol, cse):
+    compiled = sp.lambdify(symbol, expr, "numpy", cse=cse)
+    if expr.has(symbol):
+        return compiled
+    # A constant would come back as a scalar for an array argument
+    return lambda x: np.full(np.shape(x), float(compiled(x))) if np.ndim(x) else float(compiled(x))
+
+
+def as_callable(func):
+    """
+    SymPy expressions are compiled to NumPy callables, anything else is returned as is.
+    """
+    if isinstance(func, sp.Expr):
+        return compile_expression(func)[0]
+    return func
+
+
+def evaluate_on_grid(func, x):
+    """
+    Evaluates func on a whole array with one call, falling back to one call per point
+    for functions that only accept scalars.
+    """
+    try:
+        values = np.asarray(func(x), dtype=float)
+        if values.shape == x.shape:
+            return values
+    except (TypeError, ValueError, AttributeError):
+        pass
+    return np.array([float(func(value)) for value in x], dtype=float)
+
+
 def find_intervals(func, start, end, step=0.1):
     """
     Finds intervals [x1, x2] where f(x1)*f(x2) <= 0, indicating a root exists between x1 and x2.
+    The grid start, start + step, ... (up to the first point >= end) is evaluated at once.
    """
-    intervals = []
-    x1 = start
-    f_x1 = func(x1)
+    func = as_callable(func)
+    count = max(int(np.ceil((end - start) / step - 1e-9)), 0)
+    x = start + step * np.arange(count + 1)
+    f = evaluate_on_grid(func, x)
+    cells = np.flatnonzero(f[:-1] * f[1:] <= 0)
+    intervals = [(float(x[i]), float(x[i + 1])) for i in cells]
+
+    if Trace.enabled:
+        Trace.emit("FindingRoots", "intervals", str(intervals), intervals=intervals)
+    return intervals
 
-    while x1 < end:
-        x2 = x1 + step
-        f_x2 = func(x2)
 
-        if f_x1 * f_x2 <= 0:
-            intervals.append((x1, x2))
+def _sign_change_cells(F):
+    """
+    Cells [j, j+1] of every row of F that bracket a root: a sign change, or an exact zero at the right end.
+    A zero at the first point of a row has no cell on its left and belongs to the first cell.
+    :return: (rows, columns, zero columns) of the cells - the column of the exact zero, -1 for a sign change
+    """
+    left, right = F[:, :-1], F[:, 1:]
+    first_zero = np.zeros(left.shape, dtype=bool)
+    first_zero[:, 0] = (left[:, 0] == 0) & (right[:, 0] != 0)
+    rows, columns = np.nonzero((left * right < 0) | (right == 0) | first_zero)
+    zero_columns = np.where(F[rows, columns + 1] == 0, columns + 1, np.where(F[rows, columns] == 0, columns, -1))
+    return rows, columns, zero_columns
 
-        x1 = x2
-        f_x1 = f_x2
 
-    print(intervals)
-    return intervals
+def _near_zero_cells(F):
+    """
+    Cells of every row of F (uniformly spaced) that may hide roots without a sign change at their ends:
+    around an interior local minimum of |f| that is small compared to the curvature of the parabola
+    through points j-1, j, j+1 (a double root, or two roots closer than the grid spacing),
+    and right of an exact zero
+    :return: (rows, left columns, right columns) of the cells
+    """
+    magnitude = np.abs(F)
+    rows, columns = np.nonzero((magnitude[:, 1:-1] < magnitude[:, :-2]) & (magnitude[:, 1:-1] <= magnitude[:, 2:]))
+    f0, f1, f2 = F[rows, columns], F[rows, columns + 1], F[rows, columns + 2]
+    sign = np.sign(f1)
+    g0, g1, g2 = sign * f0, sign * f1, sign * f2
+    curvature = (g0 - 2 * g1 + g2) / 2
+    # Within a quadratic model the minimum can reach zero less than a cell away
+    touches = (g0 > 0) & (g1 > 0) & (g2 > 0) & (g1 <= curvature)
+    zero_rows, zero_columns = np.nonzero((F[:, :-1] == 0) & (F[:, 1:] != 0))
+    return (np.concatenate((rows[touches], zero_rows)),
+            np.concatenate((columns[touches], zero_columns)),
+            np.concatenate((columns[touches] + 2, zero_columns + 1)))
+
+
+def _scan_cells(X, F):
+    """
+    Bracketing and near-zero cells of the rows of points X with the values F, without duplicates:
+    an exact zero shared by two rows is bracketed once, a cell found in two overlapping rows is kept once
+    :return: (brackets k x 3 of [x1, x2, key], near-zero cells m x 2) - the key of a bracket is its exact
+             zero, or x1 for a sign change
+    """
+    rows, columns, zero_columns = _sign_change_cells(F)
+    keys = np.where(zero_columns < 0, X[rows, columns], X[rows, np.maximum(zero_columns, 0)])
+    _, first = np.unique(keys, return_index=True)
+    brackets = np.column_stack((X[rows, columns], X[rows, columns + 1], keys))[first]
+    near_rows, near_left, near_right = _near_zero_cells(F)
+    _, first = np.unique(X[near_rows, near_left], return_index=True)
+    near = np.column_stack((X[near_rows, near_left], X[near_rows, near_right]))[first]
+    return brackets, near
+
+
+def scan_intervals(func, start, end, num_points=1000001, refine=8, levels=2, chunk_size=1000000):
+    """
+    Vectorized search of every interval [x1, x2] where f changes sign or has an exact zero.
+    The grid of num_points points is evaluated in chunks, one array call each. Cells with a sign change
+    are split into `refine` sub-cells, all of them evaluated together, `levels` times. Cells around a local
+    minimum of |f| that may hide a pair of roots are refined along with them, and afterwards on their own
+    until they split into sign changes or shrink to the float resolution of the interval, so a root of
+    even multiplicity without a sign change is not returned.
+    Returns an array of shape (k, 2) of brackets with f(x1)*f(x2) <= 0, one per sign change or exact zero.
+    """
+    func = as_callable(func)
+    h = (end - start) / (num_points - 1)
+    f = np.empty(num_points)
+    for first in range(0, num_points, chunk_size):
+        last = min(first + chunk_size, num_points)
+        f[first:last] = evaluate_on_grid(func, start + h * np.arange(first, last))
+
+    brackets, near = _scan_cells((start + h * np.arange(num_points))[None, :], f[None, :])
+    found = []
+    resolution = 4 * np.finfo(float).eps * max(abs(start), abs(end))
+    t = np.linspace(0, 1, refine + 1)
+    level = 0
+    while True:
+        if level >= levels:
+            found.append(brackets)
+            brackets = brackets[:0]
+            if refine <= 2:
+                # A near-zero cell spans two sub-cells and would not shrink
+                break
+        near = near[near[:, 1] - near[:, 0] > resolution]
+        if len(brackets) == 0 and len(near) == 0:
+            break
+        a = np.concatenate((brackets[:, 0], near[:, 0]))
+        b = np.concatenate((brackets[:, 1], near[:, 1]))
+        X = a[:, None] + (b - a)[:, None] * t
+        X[:, -1] = b
+        F = evaluate_on_grid(func, X.ravel()).reshape(X.shape)
+        brackets, near = _scan_cells(X, F)
+        level += 1
+
+    if not found:
+        # Nothing was left to refine before the last level, f has no root on the interval
+        return np.empty((0, 2))
+    # Near-zero cells refined after the last level may bracket a zero already found
+    found = np.concatenate(found)
+    _, first = np.unique(found[:, 2], return_index=True)
+    found = found[first, :2]
+    return found[np.argsort(found[:, 0], kind="stable")]
 
 
 def bisection_method(func, start_point, end_point, tolerance):
     """
     Implements the Bisection Method to find a root of a function.
+    One function evaluation per iteration, f(start_point) is carried along.
     """
+    func = as_callable(func)
     iterations = 0
+    f_start = func(start_point)
     while (end_point - start_point) / 2 > tolerance:
         iterations += 1
         midpoint = (start_point + end_point) / 2
-        if func(midpoint) == 0:
+        f_midpoint = func(midpoint)
+        if f_midpoint == 0:
             return midpoint, iterations
-        elif func(start_point) * func(midpoint) < 0:
+        elif f_start * f_midpoint < 0:
             end_point = midpoint
         else:
-            start_point = midpoint
+            start_point, f_start = midpoint, f_midpoint
     root = (start_point + end_point) / 2
     return root, iterations
 
 def secant_method(func, start_point, end_point, tolerance, max_iterations=1000):
     """
     Implements the Secant Method to find a root of a function.
+    One function evaluation per iteration, the previous values are carried along.
     """
+    func = as_callable(func)
     x0, x1 = start_point, end_point
+    f_x0, f_x1 = func(x0), func(x1)
     iterations = 0
 
     for _ in range(max_iterations):
         iterations += 1
-        f_x0 = func(x0)
-        f_x1 = func(x1)
 
         if f_x1 - f_x0 == 0:
-            print("Error: Division by zero.")
+            if Trace.enabled:
+                Trace.emit("FindingRoots", "division_by_zero", "Error: Division by zero.", step=iterations)
             return None, iterations
 
         x2 = x1 - f_x1 * (x1 - x0) / (f_x1 - f_x0)
@@ -60,15 +220,101 @@ def secant_method(func, start_point, end_point, tolerance, max_iterations=1000):
             return x2, iterations
 
         x0, x1 = x1, x2
+        f_x0, f_x1 = f_x1, func(x2)
 
-    print("method did not converge.")
+    if Trace.enabled:
+        Trace.emit("FindingRoots", "not_converged", "method did not converge.", step=iterations)
     return None, iterations
 
 
+def hybrid_method(func, start_point, end_point, tolerance, n0=0, truncation=0.1):
+    """
+    Implements a safeguarded hybrid of interpolation and bisection on a bracket [start_point, end_point]
+    with a sign change. Each step takes the inverse quadratic interpolation through the cached values
+    (regula falsi when it is not usable), nudges it towards the midpoint (truncation), and projects it onto
+    an interval around the midpoint (the ITP method of Oliveira and Takahashi). The projection keeps the
+    evaluations within those of the Bisection Method plus n0, every function value is evaluated once,
+    and f(end_point) only when the budget of the Bisection Method alone has an iteration to spare for it
+    (bisection steps until then), so the n0 extra iterations widen the projection interval.
+    As with the Bisection Method, a bracket without a sign change raises a ValueError only once
+    f(end_point) is evaluated.
+    Returns (root, iterations, evaluations).
+    """
+    func = as_callable(func)
+    a, b = start_point, end_point
+    f_a = func(a)
+    evaluations = 1
+    if f_a == 0:
+        return a, 0, evaluations
+    f_b = None
+
+    # The iterations of the Bisection Method, counted on the same float widths as its loop
+    max_iterations, width = n0, b - a
+    while width / 2 > tolerance:
+        width /= 2
+        max_iterations += 1
+    # The previous bracket end, the third point of the interpolation
+    c = f_c = None
+    kappa = truncation / (b - a)
+    iterations = 0
+    while (b - a) / 2 > tolerance and iterations < max_iterations:
+        if f_b is None and tolerance * 2.0 ** (max_iterations - n0 - 1 - iterations) >= (b - a) / 2:
+            # The bracket is small enough to converge in one iteration less without the n0 slack, that one
+            # pays for f(b). Paying for it from n0 would spend the slack before the interpolation can use it
+            f_b = func(b)
+            evaluations += 1
+            max_iterations -= 1
+            if f_b == 0:
+                return b, iterations, evaluations
+            if f_a * f_b > 0:
+                raise ValueError("f(start_point) and f(end_point) must have opposite signs.")
+        midpoint = (a + b) / 2
+        radius = tolerance * 2.0 ** (max_iterations - iterations) - (b - a) / 2
+        if f_b is None:
+            x = midpoint
+        else:
+            # Interpolation
+            x = None
+            if f_c is not None and f_c != f_a and f_c != f_b:
+                x = (a * f_b * f_c / ((f_a - f_b) * (f_a - f_c)) +
+                     b * f_a * f_c / ((f_b - f_a) * (f_b - f_c)) +
+                     c * f_a * f_b / ((f_c - f_a) * (f_c - f_b)))
+                if not a < x < b:
+                    x = None
+            if x is None:
+                x = (b * f_a - a * f_b) / (f_a - f_b)
+            # Truncation - step past the root estimate so both bracket ends keep moving
+            direction = np.sign(midpoint - x)
+            shift = kappa * (b - a) ** 2
+            x = x + direction * shift if shift <= abs(midpoint - x) else midpoint
+            # Projection onto the bisection guarantee
+            if abs(x - midpoint) > radius:
+                x = midpoint - direction * radius
+
+        f_x = func(x)
+        evaluations += 1
+        iterations += 1
+        if f_x == 0:
+            return x, iterations, evaluations
+        if (f_x > 0) != (f_a > 0):
+            c, f_c = b, f_b
+            b, f_b = x, f_x
+        else:
+            c, f_c = a, f_a
+            a, f_a = x, f_x
+    return (a + b) / 2, iterations, evaluations
+
+
 def newton_raphson_method(func, derivative, initial_guess, tolerance=0.0001, max_iterations=1000):
     """
     Implements the Newton-Raphson Method to find a root of a function.
+    For a SymPy expression the derivative may be None, it is then derived symbolically.
     """
+    if derivative is None:
+        if not isinstance(func, sp.Expr):
+            raise ValueError("derivative required unless func is a sympy expression")
+        func, derivative = compile_expression(func)
+    func, derivative = as_callable(func), as_callable(derivative)
     x_current = initial_guess
     iterations = 0
 
@@ -78,7 +324,8 @@ def newton_raphson_method(func, derivative, initial_guess, tolerance=0.0001, max
         derivative_value = derivative(x_current)
 
         if derivative_value == 0:
-            print("Error: Derivative is zero.")
+            if Trace.enabled:
+                Trace.emit("FindingRoots", "zero_derivative", "Error: Derivative is zero.", step=iterations)
             return None, iterations
 
         x_next = x_current - f_value / derivative_value
@@ -88,16 +335,104 @@ def newton_raphson_method(func, derivative, initial_guess, tolerance=0.0001, max
 
         x_current = x_next
 
-    print("method did not converge.")
+    if Trace.enabled:
+        Trace.emit("FindingRoots", "not_converged", "method did not converge.", step=iterations)
     return None, iterations
 
 
-if __name__ == "__main__":
-    def sample_function(x):
-        return x**3+sp.cos(x)
+def bisection_array(func, brackets, tolerance, max_iterations=200):
+    """
+    Bisection Method on many brackets at once - each iteration evaluates the midpoints of every
+    unconverged bracket in one vectorized call, a bracket retires as soon as it converges.
+    Returns (roots, iterations) arrays, one entry per bracket.
+    """
+    func = as_callable(func)
+    brackets = np.asarray(brackets, dtype=float).reshape(-1, 2)
+    a, b = brackets[:, 0].copy(), brackets[:, 1].copy()
+    f_a = evaluate_on_grid(func, a)
+    iterations = np.zeros(len(a), dtype=int)
+    active = np.flatnonzero((b - a) / 2 > tolerance)
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        midpoint = (a[active] + b[active]) / 2
+        f_midpoint = evaluate_on_grid(func, midpoint)
+        iterations[active] += 1
+        left = f_a[active] * f_midpoint < 0
+        exact = f_midpoint == 0
+        right = ~left & ~exact
+        b[active[left | exact]] = midpoint[left | exact]
+        a[active[right | exact]] = midpoint[right | exact]
+        f_a[active[right]] = f_midpoint[right]
+        active = active[(b[active] - a[active]) / 2 > tolerance]
+    return (a + b) / 2, iterations
+
+
+def secant_array(func, brackets, tolerance, max_iterations=1000):
+    """
+    Secant Method on many brackets at once, in lockstep with one vectorized evaluation per iteration.
+    Returns (roots, iterations) arrays, roots are nan where the method failed.
+    """
+    func = as_callable(func)
+    brackets = np.asarray(brackets, dtype=float).reshape(-1, 2)
+    x0, x1 = brackets[:, 0].copy(), brackets[:, 1].copy()
+    f_x0, f_x1 = evaluate_on_grid(func, x0), evaluate_on_grid(func, x1)
+    roots = np.full(len(x0), np.nan)
+    iterations = np.zeros(len(x0), dtype=int)
+    active = np.arange(len(x0))
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        iterations[active] += 1
+        denominator = f_x1[active] - f_x0[active]
+        # Division by zero - the bracket fails
+        active = active[denominator != 0]
+        denominator = denominator[denominator != 0]
+        x2 = x1[active] - f_x1[active] * (x1[active] - x0[active]) / denominator
+        converged = np.abs(x2 - x1[active]) < tolerance
+        roots[active[converged]] = x2[converged]
+        active, x2 = active[~converged], x2[~converged]
+        x0[active], f_x0[active] = x1[active], f_x1[active]
+        x1[active], f_x1[active] = x2, evaluate_on_grid(func, x2)
+    return roots, iterations
+
+
+def newton_raphson_array(func, derivative, initial_guesses, tolerance=0.0001, max_iterations=1000):
+    """
+    Newton-Raphson Method from many initial guesses at once, in lockstep with one vectorized evaluation
+    of the function and of the derivative per iteration.
+    Returns (roots, iterations) arrays, roots are nan where the method failed.
+    """
+    if derivative is None:
+        if not isinstance(func, sp.Expr):
+            raise ValueError("derivative required unless func is a sympy expression")
+        func, derivative = compile_expression(func)
+    func, derivative = as_callable(func), as_callable(derivative)
+    x = np.asarray(initial_guesses, dtype=float).reshape(-1).copy()
+    roots = np.full(len(x), np.nan)
+    iterations = np.zeros(len(x), dtype=int)
+    active = np.arange(len(x))
+    for _ in range(max_iterations):
+        if len(active) == 0:
+            break
+        iterations[active] += 1
+        f_value = evaluate_on_grid(func, x[active])
+        derivative_value = evaluate_on_grid(derivative, x[active])
+        # Zero derivative - the guess fails
+        usable = derivative_value != 0
+        active, f_value, derivative_value = active[usable], f_value[usable], derivative_value[usable]
+        x_next = x[active] - f_value / derivative_value
+        converged = np.abs(x_next - x[active]) < tolerance
+        roots[active[converged]] = x_next[converged]
+        x[active] = x_next
+        active = active[~converged]
+    return roots, iterations
+
 
-    def sample_derivative(x):
-        return 3*x**2-sp.sin(x)
+if __name__ == "__main__":
+    Trace.enable(Trace.print_sink)
+    x = sp.symbols("x")
+    sample_function = x**3+sp.cos(x)
 
     start = -10
     end = 10
@@ -109,20 +444,24 @@ if __name__ == "__main__":
     print("Intervals:", intervals)
 
     print("\nFinding roots using Bisection Method:")
-    for interval in intervals:
-        root, iterations = bisection_method(sample_function, interval[0], interval[1], tolerance)
-        if root is not None:
-            print(f"Root found using Bisection: {root} (in {iterations} iterations)")
+    roots, iterations = bisection_array(sample_function, intervals, tolerance)
+    for root, count in zip(roots, iterations):
+        print(f"Root found using Bisection: {root} (in {count} iterations)")
 
     print("\nFinding roots using Secant Method:")
-    for interval in intervals:
-        root, iterations = secant_method(sample_function, interval[0], interval[1], tolerance)
-        if root is not None:
-            print(f"Root found using Secant: {root} (in {iterations} iterations)")
+    roots, iterations = secant_array(sample_function, intervals, tolerance)
+    for root, count in zip(roots, iterations):
+        if not np.isnan(root):
+            print(f"Root found using Secant: {root} (in {count} iterations)")
 
     print("\nFinding roots using Newton-Raphson Method:")
+    initial_guesses = [(interval[0] + interval[1]) / 2 for interval in intervals]
+    roots, iterations = newton_raphson_array(sample_function, None, initial_guesses, tolerance)
+    for root, count in zip(roots, iterations):
+        if not np.isnan(root):
+            print(f"Root found using Newton-Raphson: {root} (in {count} iterations)")
+
+    print("\nFinding roots using the Hybrid Method:")
     for interval in intervals:
-        initial_guess = (interval[0] + interval[1]) / 2
-        root, iterations = newton_raphson_method(sample_function, sample_derivative, initial_guess, tolerance)
-        if root is not None:
-            print(f"Root found using Newton-Raphson: {root} (in {iterations} iterations)")
+        root, iterations, evaluations = hybrid_method(sample_function, interval[0], interval[1], tolerance)
+        print(f"Root found using Hybrid: {root} (in {iterations} iterations, {evaluations} function evaluations)")
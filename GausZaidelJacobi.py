@@ -1,80 +1,856 @@
+import os
+from collections import deque
+
+import numpy as np
+
+import Trace
+from MatrixUtility import ReorderDominant
+
+
+class CSRMatrix:
+    """
+    Compressed sparse row matrix - the entries of row i are data[indptr[i]:indptr[i + 1]]
+    in the columns indices[indptr[i]:indptr[i + 1]]
+    """
+
+    def __init__(self, data, indices, indptr, shape=None):
+        self.data = np.asarray(data, dtype=float)
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.indptr = np.asarray(indptr, dtype=np.intp)
+        n = len(self.indptr) - 1
+        self.shape = (n, n) if shape is None else tuple(shape)
+        # Row of every stored entry, so a product is a single pass over the entries - O(nnz)
+        self._rows = np.repeat(np.arange(n), np.diff(self.indptr))
+        # Gauss-Seidel level schedule, found on the first sweep (see sweep_levels)
+        self._levels = None
+        self._levels_found = False
+
+    @classmethod
+    def from_dense(cls, matrix):
+        matrix = np.asarray(matrix, dtype=float)
+        rows, cols = np.nonzero(matrix)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(matrix)))))
+        return cls(matrix[rows, cols], cols, indptr, matrix.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def dot(self, x):
+        return np.bincount(self._rows, weights=self.data * x[self.indices], minlength=self.shape[0])
+
+    def diagonal(self):
+        d = np.zeros(self.shape[0])
+        on_diagonal = self.indices == self._rows
+        np.add.at(d, self._rows[on_diagonal], self.data[on_diagonal])
+        return d
+
+    def abs_row_sums(self):
+        return np.bincount(self._rows, weights=np.abs(self.data), minlength=self.shape[0])
+
+    def toarray(self):
+        dense = np.zeros(self.shape)
+        np.add.at(dense, (self._rows, self.indices), self.data)
+        return dense
+
+    def sweep_levels(self):
+        """
+        :return: Level schedule of a Gauss-Seidel sweep over the rows (see _sweep_levels), or None if the rows
+                 are swept one by one. The pattern is fixed, so it is found once per matrix
+        """
+        if not self._levels_found:
+            self._levels = _sweep_levels(self, 0)
+            self._levels_found = True
+        return self._levels
+
+
+# Default memory budget of one streamed row block
+BLOCK_BYTES = 1 << 26
+
+
+class _RowBlockStream:
+    """
+    Matrix kept on disk and read in row blocks, one sequential pass per product or sweep.
+    io_stats counts the bytes read: "bytes_read" in total, "per_iteration" for every iteration of the latest solve
+    and "omega_estimate" for the latest estimate_sor_omega (read before the first iteration of a SOR solve).
+    """
+
+    def __init__(self, shape, block_rows):
+        self.shape = tuple(shape)
+        self.block_rows = max(1, int(block_rows))
+        self.io_stats = {"bytes_read": 0, "per_iteration": [], "omega_estimate": 0}
+        self._diagonal = None
+        self._abs_row_sums = None
+        self._counted = 0
+        # Rows of every level of the CSR block starting at each first row, None for a block whose rows form
+        # long dependency chains and are swept row by row. O(n) ints, the entry positions are found per sweep
+        self._block_levels = {}
+
+    def __len__(self):
+        return self.shape[0]
+
+    def row_blocks(self, reverse=False):
+        """
+        :return: Generator of (first row, block) - a block is an in-memory dense array or CSRMatrix of its rows,
+                 with the global column numbers
+        """
+        starts = range(0, self.shape[0], self.block_rows)
+        for start in (reversed(starts) if reverse else starts):
+            block, size = self._read(start, min(start + self.block_rows, self.shape[0]))
+            self.io_stats["bytes_read"] += size
+            yield start, block
+
+    def dot(self, x):
+        y = np.empty(self.shape[0])
+        for start, block in self.row_blocks():
+            y[start:start + len(block)] = block.dot(x)
+        return y
+
+    def diagonal(self):
+        if self._diagonal is None:
+            self._scan()
+        return self._diagonal
+
+    def abs_row_sums(self):
+        if self._abs_row_sums is None:
+            self._scan()
+        return self._abs_row_sums
+
+    def _scan(self):
+        # One pass for both, they are needed together (setup and the dominance check)
+        self._diagonal = np.zeros(self.shape[0])
+        self._abs_row_sums = np.zeros(self.shape[0])
+        for start, block in self.row_blocks():
+            stop = start + len(block)
+            if isinstance(block, CSRMatrix):
+                on_diagonal = block.indices == block._rows + start
+                np.add.at(self._diagonal, block._rows[on_diagonal] + start, block.data[on_diagonal])
+                self._abs_row_sums[start:stop] = block.abs_row_sums()
+            else:
+                self._diagonal[start:stop] = block[np.arange(len(block)), np.arange(start, stop)]
+                self._abs_row_sums[start:stop] = np.sum(np.abs(block), axis=1)
+
+    def start_solve(self):
+        # per_iteration describes the latest solve, bytes_read keeps growing (it includes the one-time diagonal scan)
+        self.io_stats["per_iteration"] = []
+        self._counted = self.io_stats["bytes_read"]
+
+    def end_iteration(self):
+        # Bytes read since the previous iteration
+        read = self.io_stats["bytes_read"] - self._counted
+        self._counted = self.io_stats["bytes_read"]
+        self.io_stats["per_iteration"].append(read)
+        return read
+
+
+class StreamedMatrix(_RowBlockStream):
+    """
+    Dense matrix in a .npy file or np.memmap, streamed in blocks of block_rows rows
+    """
+
+    def __init__(self, source, block_rows=None):
+        self.array = np.load(source, mmap_mode="r") if isinstance(source, (str, os.PathLike)) else source
+        n, m = self.array.shape
+        super().__init__((n, m), block_rows or BLOCK_BYTES // (8 * max(m, 1)))
+
+    def _read(self, start, stop):
+        block = np.array(self.array[start:stop], dtype=float)
+        return block, block.nbytes
+
+
+class StreamedCSRMatrix(_RowBlockStream):
+    """
+    CSR matrix stored on disk as a directory of data.npy, indices.npy and indptr.npy (see save_csr), the entries
+    are memory-mapped and streamed in blocks of block_rows rows, only indptr is kept in memory
+    """
+
+    def __init__(self, directory, block_rows=None):
+        self.data = np.load(os.path.join(directory, "data.npy"), mmap_mode="r")
+        self.indices = np.load(os.path.join(directory, "indices.npy"), mmap_mode="r")
+        self.indptr = np.load(os.path.join(directory, "indptr.npy")).astype(np.intp)
+        n = len(self.indptr) - 1
+        shape_file = os.path.join(directory, "shape.npy")
+        shape = tuple(np.load(shape_file)) if os.path.exists(shape_file) else (n, n)
+        entry_bytes = self.data.itemsize + self.indices.itemsize
+        average = max(1, self.indptr[-1] // max(n, 1))
+        super().__init__(shape, block_rows or BLOCK_BYTES // (entry_bytes * average))
+
+    def _read(self, start, stop):
+        first, last = self.indptr[start], self.indptr[stop]
+        data = np.array(self.data[first:last], dtype=float)
+        indices = np.array(self.indices[first:last], dtype=np.intp)
+        block = CSRMatrix(data, indices, self.indptr[start:stop + 1] - first, (stop - start, self.shape[1]))
+        return block, self.data.itemsize * len(data) + self.indices.itemsize * len(indices)
+
+
+def save_csr(directory, A):
+    """
+    Write a matrix in the on-disk CSR format read by StreamedCSRMatrix
+    :param directory: Directory to create (or reuse)
+    :param A: Dense matrix, CSRMatrix or any object with data/indices/indptr
+    """
+    A = _as_operator(A)
+    A = A if isinstance(A, CSRMatrix) else CSRMatrix.from_dense(A)
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "data.npy"), A.data)
+    np.save(os.path.join(directory, "indices.npy"), A.indices)
+    np.save(os.path.join(directory, "indptr.npy"), A.indptr)
+    np.save(os.path.join(directory, "shape.npy"), np.array(A.shape))
+
+
+def _as_operator(A):
+    """
+    Dense matrices become float arrays, sparse ones (CSRMatrix or any object with
+    data/indices/indptr such as scipy.sparse.csr_matrix) become a CSRMatrix.
+    Matrices on disk are streamed: a .npy path or np.memmap becomes a StreamedMatrix,
+    a directory in the save_csr format a StreamedCSRMatrix
+    """
+    if isinstance(A, (CSRMatrix, _RowBlockStream)):
+        return A
+    if isinstance(A, np.memmap):
+        return StreamedMatrix(A)
+    if isinstance(A, (str, os.PathLike)):
+        return StreamedCSRMatrix(A) if os.path.isdir(A) else StreamedMatrix(A)
+    if hasattr(A, "indptr") and hasattr(A, "indices"):
+        return CSRMatrix(A.data, A.indices, A.indptr, A.shape)
+    return np.asarray(A, dtype=float)
+
+
+def _as_system(A, B, check_diagonal=True):
+    A = _as_operator(A)
+    b = np.asarray(B, dtype=float).reshape(-1)
+    if check_diagonal and np.any(A.diagonal() == 0):
+        raise ValueError("Zero on the main diagonal, the iterative methods cannot be used.")
+    return A, b
+
+
 def is_diagonally_dominant(matrix):
-    n = len(matrix)
-    for i in range(n):
-        row_sum = sum(abs(matrix[i][j]) for j in range(n) if i != j)
-        if abs(matrix[i][i]) < row_sum:
-            return False
-    return True
+    A = _as_operator(matrix)
+    d = np.abs(A.diagonal())
+    if isinstance(A, (CSRMatrix, _RowBlockStream)):
+        row_sum = A.abs_row_sums() - d
+    else:
+        row_sum = np.sum(np.abs(A), axis=1) - d
+    return bool(np.all(d >= row_sum))
 
 
 def make_diagonally_dominant(matrix, vector):
-    n = len(matrix)
-    indices = list(range(n))
-    for i in range(n):
-        max_row = max(indices, key=lambda k: abs(matrix[k][i]))
-        if abs(matrix[max_row][i]) < sum(abs(matrix[max_row][j]) for j in range(n) if j != i):
-            continue
-        matrix[i], matrix[max_row] = matrix[max_row], matrix[i]
-        vector[i], vector[max_row] = vector[max_row], vector[i]
+    """
+    Reorder the rows of A and b by the assignment of MatrixUtility.DominantPermutation - strictly
+    dominant whenever such an ordering exists, otherwise the most dominant ordering
+    :return: (matrix, vector) reordered copies of the same types
+    """
+    matrix, vector, _, _ = ReorderDominant(matrix, vector)
     return matrix, vector
 
 
+def _trace_status(status, message, matrix):
+    if Trace.enabled:
+        Trace.emit("GausZaidelJacobi", "diagonal_dominance", message, matrix=matrix, status=status)
+
+
 def process_matrix(matrix, vector):
     if is_diagonally_dominant(matrix):
-        print("The matrix is already diagonally dominant.")
+        _trace_status("dominant", "The matrix is already diagonally dominant.", matrix)
         return matrix, vector
 
-    print("The matrix is not diagonally dominant. Attempting to rearrange...")
+    _trace_status("rearranging", "The matrix is not diagonally dominant. Attempting to rearrange...", matrix)
     matrix, vector = make_diagonally_dominant(matrix, vector)
 
     if is_diagonally_dominant(matrix):
-        print("The matrix has been rearranged and is now diagonally dominant.")
+        _trace_status("rearranged", "The matrix has been rearranged and is now diagonally dominant.", matrix)
         return matrix, vector
     else:
-        print("The matrix cannot be made diagonally dominant.")
+        _trace_status("failed", "The matrix cannot be made diagonally dominant.", matrix)
         return None, None
 
 
-def jacobi_method(A, B, tolerance=0.00001, max_iterations=100):
+def _iterate(steps, b, tolerance, max_iterations, criterion, A=None):
+    """
+    Drive the steps of an iterative method until convergence
+    :param steps: Generator of (x, residual, step) - ||b-Ax||inf and ||x_new-x||inf of every iteration,
+                  the residual may be None when the criterion does not need it
+    :param criterion: "step" stops when ||x_new-x||inf < tolerance,
+                      "residual" when ||b-Ax||inf <= tolerance * ||b||inf
+    :param A: The operator, it computes a missing residual of the final iterate,
+              a streamed one records the bytes read by every iteration
+    :return: Generator of (iteration, x, residual)
+    """
+    if criterion not in ("step", "residual"):
+        raise ValueError(f"Unknown stopping criterion {criterion!r}.")
+    b_norm = np.max(np.abs(b), initial=0)
+    streamed = isinstance(A, _RowBlockStream)
+    if streamed:
+        A.start_solve()
+    for iteration, (x, residual, step) in zip(range(1, max_iterations + 1), steps):
+        if residual is None and (step < tolerance or iteration == max_iterations):
+            residual = np.max(np.abs(b - A.dot(x)))
+        bytes_read = A.end_iteration() if streamed else None
+        if Trace.enabled:
+            Trace.emit("GausZaidelJacobi", "iteration", step=iteration, matrix=x, residual=residual, step_norm=step,
+                       bytes_read=bytes_read)
+        yield iteration, x, residual
+        if criterion == "step" and step < tolerance:
+            return
+        if criterion == "residual" and residual <= tolerance * b_norm:
+            return
+
+
+def _jacobi_steps(A, b):
+    d = A.diagonal()
+    x = np.zeros(len(b))
+    r = b - A.dot(x)
+    while True:
+        # x_new = D(-1)(b - (A - D)x) = x + D(-1)r, one matrix-vector product per iteration
+        step = r / d
+        x += step
+        r = b - A.dot(x)
+        yield x, np.max(np.abs(r)), np.max(np.abs(step))
+
+
+def _gauss_seidel_sweep(A, b, d, x, omega=1.0, reverse=False):
+    """
+    One in-place (over-relaxed) Gauss-Seidel sweep, O(nnz) for a CSRMatrix.
+    The rows of a CSRMatrix are updated a level at a time (see _sweep_levels), with the same result as
+    the row by row sweep. Matrices whose rows form long chains of dependencies (e.g. tridiagonal) have
+    no such levels and are still swept row by row in Python, about 5 s per sweep for 10^6 unknowns.
+    :return: The largest change of an unknown
+    """
+    if isinstance(A, _RowBlockStream):
+        # One block in memory at a time, the rows of a block use the values already updated in earlier blocks
+        return max((_sweep_block(A, start, block, b, d, x, omega, reverse) for start, block in A.row_blocks(reverse)),
+                   default=0.0)
+    levels = A.sweep_levels() if isinstance(A, CSRMatrix) else None
+    return _sweep_rows(A, b, d, x, omega, reverse, 0, levels)
+
+
+def _sweep_block(A, start, block, b, d, x, omega, reverse):
+    # Sweep over the rows start, start + 1, ... of a streamed matrix held in block
+    levels = None
+    if isinstance(block, CSRMatrix):
+        if start not in A._block_levels:
+            levels = _sweep_levels(block, start)
+            A._block_levels[start] = None if levels is None else [rows for rows, _, _ in levels]
+        elif A._block_levels[start] is not None:
+            levels = [(rows, *_row_ranges(block.indptr, rows)) for rows in A._block_levels[start]]
+    return _sweep_rows(block, b, d, x, omega, reverse, start, levels)
+
+
+def _sweep_levels(A, offset, min_level_size=8):
+    """
+    Level schedule of a Gauss-Seidel sweep over the rows of a CSRMatrix: rows i < j depend on each other when
+    a_ij or a_ji is nonzero, and every level holds rows that depend only on rows of earlier levels. Updating
+    the levels in order (in reverse for a backward sweep) gives each row the new values of its neighbours
+    before it and the old ones of its neighbours after it, exactly as the row by row sweep.
+    :param offset: Row of the system of the first row of A, the columns of A are the system's
+    :param min_level_size: Below this average number of rows per level the schedule is dropped
+    :return: List of (rows, entry positions, row of each entry within the level), or None
+    """
     n = len(A)
-    x = [0] * n
-    x_new = x[:]
-    results = []
+    columns = A.indices - offset
+    inside = (columns >= 0) & (columns < n) & (columns != A._rows)
+    first = np.minimum(A._rows[inside], columns[inside])
+    edges = np.sort(first * n + np.maximum(A._rows[inside], columns[inside]))
+    edges = edges[np.concatenate(([True], edges[1:] != edges[:-1]))]
+    # Sorted by the earlier row, the rows depending on row i are later[bounds[i]:bounds[i + 1]]
+    earlier, later = np.divmod(edges, n)
+    bounds = np.searchsorted(earlier, np.arange(n + 1))
+    waiting = np.bincount(later, minlength=n)
+    level = np.flatnonzero(waiting == 0)
+    levels = []
+    while len(level):
+        if len(levels) * min_level_size > n:
+            return None
+        positions, owner = _row_ranges(A.indptr, level)
+        levels.append((level, positions, owner))
+        dependents, counts = np.unique(later[_row_ranges(bounds, level)[0]], return_counts=True)
+        waiting[dependents] -= counts
+        level = dependents[waiting[dependents] == 0]
+    return levels
 
-    for iteration in range(max_iterations):
-        for i in range(n):
-            s = sum(A[i][j] * x[j] for j in range(n) if j != i)
-            x_new[i] = (B[i][0] - s) / A[i][i]
-        results.append(x_new[:])
-        if all(abs(x_new[i] - x[i]) < tolerance for i in range(n)):
-            return results, iteration + 1
-        x = x_new[:]
 
-    return results, max_iterations
+def _row_ranges(bounds, rows):
+    # Concatenated ranges bounds[r]:bounds[r + 1] of the rows, and the index in rows owning each position
+    counts = bounds[rows + 1] - bounds[rows]
+    owner = np.repeat(np.arange(len(rows)), counts)
+    return np.arange(len(owner)) + np.repeat(bounds[rows] - np.cumsum(counts) + counts, counts), owner
 
 
-def gauss_seidel_method(A, B, tolerance=0.00001, max_iterations=100):
+def _sweep_rows(A, b, d, x, omega, reverse, offset, levels=None):
+    # Rows of A are the rows offset, offset + 1, ... of the system
     n = len(A)
-    x = [0] * n
-    results = []
+    rows = range(n - 1, -1, -1) if reverse else range(n)
+    largest = 0.0
+    if levels is not None:
+        data, indices = A.data, A.indices
+        for level, positions, owner in (reversed(levels) if reverse else levels):
+            system_rows = offset + level
+            products = np.bincount(owner, weights=data[positions] * x[indices[positions]], minlength=len(level))
+            change = omega * (b[system_rows] - products) / d[system_rows]
+            x[system_rows] += change
+            largest = max(largest, np.max(np.abs(change)))
+    elif isinstance(A, CSRMatrix):
+        data, indices, indptr = A.data, A.indices, A.indptr
+        for i in rows:
+            start, end = indptr[i], indptr[i + 1]
+            change = omega * (b[offset + i] - data[start:end] @ x[indices[start:end]]) / d[offset + i]
+            x[offset + i] += change
+            largest = max(largest, abs(change))
+    else:
+        for i in rows:
+            change = omega * (b[offset + i] - A[i] @ x) / d[offset + i]
+            x[offset + i] += change
+            largest = max(largest, abs(change))
+    return largest
+
+
+def _residual_norm(A, b, x, needed=True):
+    # The sweeps do not produce b - Ax, the extra product is skipped while the criterion does not use it
+    return np.max(np.abs(b - A.dot(x))) if needed else None
+
+
+def _streamed_steps(A, b, omega, symmetric):
+    """
+    Gauss-Seidel, SOR or SSOR on a streamed matrix when every iteration needs its residual: the residual of x_k
+    is formed block by block in the forward sweep that computes x_k+1, while the block is in memory, so an
+    iteration reads the matrix once per sweep instead of once more for b - Ax. x_k is yielded after that
+    sweep, the last sweep is not used.
+    """
+    d = A.diagonal()
+    x = np.zeros(len(b))
+    previous = x.copy()
+    step = None
+    while True:
+        previous[:] = x
+        residual, largest = 0.0, 0.0
+        for start, block in A.row_blocks():
+            rows = slice(start, start + len(block))
+            residual = max(residual, np.max(np.abs(b[rows] - block.dot(previous)), initial=0))
+            largest = max(largest, _sweep_block(A, start, block, b, d, x, omega, False))
+        if symmetric:
+            _gauss_seidel_sweep(A, b, d, x, omega, reverse=True)
+            largest = np.max(np.abs(x - previous))
+        if step is not None:
+            yield previous, residual, step
+        step = largest
+
+
+def _gauss_seidel_steps(A, b, residual=True):
+    if residual and isinstance(A, _RowBlockStream):
+        yield from _streamed_steps(A, b, 1.0, False)
+        return
+    d = A.diagonal()
+    x = np.zeros(len(b))
+    while True:
+        step = _gauss_seidel_sweep(A, b, d, x)
+        yield x, _residual_norm(A, b, x, residual), step
 
-    for iteration in range(max_iterations):
-        x_new = x[:]
-        for i in range(n):
-            s1 = sum(A[i][j] * x_new[j] for j in range(i))
-            s2 = sum(A[i][j] * x[j] for j in range(i + 1, n))
-            x_new[i] = (B[i][0] - s1 - s2) / A[i][i]
-        results.append(x_new[:])
-        if all(abs(x_new[i] - x[i]) < tolerance for i in range(n)):
-            return results, iteration + 1
-        x = x_new[:]
 
-    return results, max_iterations
+def _sor_steps(A, b, omega, residual=True):
+    if residual and isinstance(A, _RowBlockStream):
+        yield from _streamed_steps(A, b, omega, False)
+        return
+    d = A.diagonal()
+    x = np.zeros(len(b))
+    while True:
+        step = _gauss_seidel_sweep(A, b, d, x, omega)
+        yield x, _residual_norm(A, b, x, residual), step
+
+
+def _ssor_steps(A, b, omega, residual=True):
+    if residual and isinstance(A, _RowBlockStream):
+        yield from _streamed_steps(A, b, omega, True)
+        return
+    d = A.diagonal()
+    x = np.zeros(len(b))
+    while True:
+        x_old = x.copy()
+        # A forward sweep followed by a backward one
+        _gauss_seidel_sweep(A, b, d, x, omega)
+        _gauss_seidel_sweep(A, b, d, x, omega, reverse=True)
+        yield x, _residual_norm(A, b, x, residual), np.max(np.abs(x - x_old))
+
+
+def estimate_sor_omega(A, iterations=None):
+    """
+    Optimal SOR relaxation factor w = 2 / (1 + sqrt(1 - p^2)), where p, the spectral radius
+    of the Jacobi iteration matrix I - D(-1)A, is estimated by power iteration
+    :param A: Matrix nxn (dense, CSRMatrix or streamed)
+    :param iterations: Power iteration steps of two products each, by default 50, and 10 for a streamed
+                       matrix where every product is a pass over the file (counted in io_stats["omega_estimate"])
+    :return: w in [1, 2), 1 when the Jacobi method does not converge
+    """
+    A = _as_operator(A)
+    d = A.diagonal()
+    if isinstance(A, _RowBlockStream):
+        before = A.io_stats["bytes_read"]
+        try:
+            return _power_omega(A, d, 10 if iterations is None else iterations)
+        finally:
+            A.io_stats["omega_estimate"] = A.io_stats["bytes_read"] - before
+    return _power_omega(A, d, 50 if iterations is None else iterations)
+
+
+def _power_omega(A, d, iterations):
+    v = np.random.default_rng(0).uniform(-1, 1, len(d))
+    rho = 0.0
+    for _ in range(iterations):
+        # Two steps at a time, the spectrum is often symmetric (+p and -p)
+        w = v - A.dot(v) / d
+        w = w - A.dot(w) / d
+        norm = np.linalg.norm(w)
+        if norm == 0:
+            return 1.0
+        rho = np.sqrt(norm / np.linalg.norm(v))
+        v = w / norm
+    if rho >= 1:
+        return 1.0
+    return float(2 / (1 + np.sqrt(1 - rho ** 2)))
+
+
+def _ilu0(A):
+    """
+    Incomplete LU factorization with the sparsity pattern of A (ILU(0))
+    :return: (data, indices, indptr, diagonal positions) of L and U packed in CSR form
+    """
+    if isinstance(A, _RowBlockStream):
+        raise ValueError("ILU(0) needs the matrix in memory, use the Jacobi preconditioner for a streamed matrix.")
+    A = A if isinstance(A, CSRMatrix) else CSRMatrix.from_dense(A)
+    n = len(A)
+    indptr = A.indptr.copy()
+    indices = np.empty_like(A.indices)
+    data = np.empty_like(A.data)
+    diagonal = np.empty(n, dtype=np.intp)
+    # Sort every row by column
+    for i in range(n):
+        start, end = indptr[i], indptr[i + 1]
+        order = np.argsort(A.indices[start:end], kind="stable")
+        indices[start:end] = A.indices[start:end][order]
+        data[start:end] = A.data[start:end][order]
+        on_diagonal = np.flatnonzero(indices[start:end] == i)
+        if len(on_diagonal) == 0:
+            raise ValueError("ILU(0) needs a nonzero pattern on the main diagonal.")
+        diagonal[i] = start + on_diagonal[0]
+    for i in range(1, n):
+        start, end = indptr[i], indptr[i + 1]
+        position = {col: pos for pos, col in enumerate(indices[start:end].tolist(), start)}
+        for pos in range(start, diagonal[i]):
+            k = indices[pos]
+            data[pos] /= data[diagonal[k]]
+            # Update only the entries already in the pattern of row i
+            for kpos in range(diagonal[k] + 1, indptr[k + 1]):
+                target = position.get(indices[kpos])
+                if target is not None:
+                    data[target] -= data[pos] * data[kpos]
+    if np.any(data[diagonal] == 0):
+        raise ValueError("Zero pivot in ILU(0).")
+    return data, indices, indptr, diagonal
+
+
+def _preconditioner(A, name):
+    """
+    :param name: None, "jacobi" or "ilu0"
+    :return: Function r -> M(-1)r
+    """
+    if name is None:
+        return lambda r: r
+    if name == "jacobi":
+        d = A.diagonal()
+        if np.any(d == 0):
+            raise ValueError("Zero on the main diagonal, the Jacobi preconditioner cannot be used.")
+        return lambda r: r / d
+    if name == "ilu0":
+        data, indices, indptr, diagonal = _ilu0(A)
+        n = len(diagonal)
+
+        def solve(r):
+            y = np.array(r, dtype=float)
+            # L y = r, unit diagonal
+            for i in range(n):
+                start, mid = indptr[i], diagonal[i]
+                y[i] -= data[start:mid] @ y[indices[start:mid]]
+            # U x = y
+            for i in range(n - 1, -1, -1):
+                mid, end = diagonal[i], indptr[i + 1]
+                y[i] = (y[i] - data[mid + 1:end] @ y[indices[mid + 1:end]]) / data[mid]
+            return y
+
+        return solve
+    raise ValueError(f"Unknown preconditioner {name!r}.")
+
+
+def _conjugate_gradient_steps(A, b, preconditioner):
+    precondition = _preconditioner(A, preconditioner)
+    x = np.zeros(len(b))
+    r = b.copy()
+    z = precondition(r)
+    p = z.copy()
+    rz = r @ z
+    if rz == 0:
+        # x = 0 already solves the system
+        yield x, 0.0, 0.0
+        return
+    while rz != 0:
+        Ap = A.dot(p)
+        pAp = p @ Ap
+        if pAp <= 0:
+            raise ValueError("The matrix is not symmetric positive definite.")
+        alpha = rz / pAp
+        x += alpha * p
+        r -= alpha * Ap
+        step = abs(alpha) * np.max(np.abs(p))
+        z = precondition(r)
+        rz_new = r @ z
+        p = z + (rz_new / rz) * p
+        rz = rz_new
+        yield x, np.max(np.abs(r)), step
+
+
+def _gmres_steps(A, b, preconditioner, restart):
+    precondition = _preconditioner(A, preconditioner)
+    n = len(b)
+    x = np.zeros(n)
+    while True:
+        r = b - A.dot(x)
+        beta = np.linalg.norm(r)
+        if beta == 0:
+            # x already solves the system, e.g. x = 0 for b = 0
+            yield x, 0.0, 0.0
+            return
+        # Arnoldi basis V of the Krylov space of A M(-1) and its Hessenberg matrix H,
+        # R is H reduced to triangular form by the Givens rotations (cs, sn)
+        V = np.zeros((restart + 1, n))
+        H = np.zeros((restart + 1, restart))
+        R = np.zeros((restart + 1, restart))
+        cs = np.zeros(restart)
+        sn = np.zeros(restart)
+        g = np.zeros(restart + 1)
+        g[0] = beta
+        V[0] = r / beta
+        x0 = x.copy()
+        for k in range(restart):
+            w = A.dot(precondition(V[k]))
+            for j in range(k + 1):
+                H[j, k] = w @ V[j]
+                w -= H[j, k] * V[j]
+            H[k + 1, k] = np.linalg.norm(w)
+            breakdown = H[k + 1, k] == 0
+            if not breakdown:
+                V[k + 1] = w / H[k + 1, k]
+            R[:k + 2, k] = H[:k + 2, k]
+            for j in range(k):
+                R[j, k], R[j + 1, k] = cs[j] * R[j, k] + sn[j] * R[j + 1, k], cs[j] * R[j + 1, k] - sn[j] * R[j, k]
+            denominator = np.hypot(R[k, k], R[k + 1, k])
+            if denominator == 0:
+                # A M(-1) maps the Krylov space to a smaller one, the least squares problem has no unique solution
+                raise np.linalg.LinAlgError("GMRES breakdown, the matrix is singular.")
+            cs[k], sn[k] = R[k, k] / denominator, R[k + 1, k] / denominator
+            R[k, k], R[k + 1, k] = denominator, 0.0
+            g[k + 1] = -sn[k] * g[k]
+            g[k] = cs[k] * g[k]
+            # Least squares solution of the small triangular system, x = x0 + M(-1)Vy
+            y = _back_substitution(R[:k + 1, :k + 1], g[:k + 1])
+            x_new = x0 + precondition(y @ V[:k + 1])
+            # r = V(beta e1 - Hy), without another product with A
+            coefficients = -(H[:k + 2, :k + 1] @ y)
+            coefficients[0] += beta
+            residual = np.max(np.abs(coefficients @ V[:k + 2]))
+            step = np.max(np.abs(x_new - x))
+            x[:] = x_new
+            yield x, residual, step
+            if breakdown:
+                return
+
+
+def _back_substitution(U, y):
+    x = np.array(y, dtype=float)
+    for i in range(len(x) - 1, -1, -1):
+        x[i] = (x[i] - U[i, i + 1:] @ x[i + 1:]) / U[i, i]
+    return x
+
+
+class IterationHistory:
+    """
+    The iterates a solver keeps: all of them ("all"), the last k ("last"), every m-th
+    ("every", the final iterate is always kept) or only the final one ("none")
+    """
+
+    def __init__(self, mode="all", keep=1):
+        if mode not in ("all", "last", "every", "none"):
+            raise ValueError(f"Unknown history mode {mode!r}.")
+        if keep < 1:
+            raise ValueError("keep must be a positive integer.")
+        self.mode = mode
+        self.keep = keep
+        maxlen = keep if mode == "last" else None
+        self.iterations = deque(maxlen=maxlen)
+        self.values = deque(maxlen=maxlen)
+        self.residuals = deque(maxlen=maxlen)
+
+    def record(self, iteration, x, residual):
+        if self.mode == "all" or self.mode == "last" or (self.mode == "every" and iteration % self.keep == 0):
+            self._append(iteration, x, residual)
+
+    def finish(self, iteration, x, residual):
+        if x is not None and (not self.iterations or self.iterations[-1] != iteration):
+            self._append(iteration, x, residual)
+
+    def _append(self, iteration, x, residual):
+        self.iterations.append(iteration)
+        self.values.append(x.copy())
+        self.residuals.append(residual)
+
+    def items(self):
+        return zip(self.iterations, self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+
+def jacobi_iterations(A, B, tolerance=0.00001, max_iterations=100, criterion="step"):
+    """
+    Jacobi method as a generator of (iteration, x, residual) - x is the solver's working
+    vector, copy it to keep it past the next iteration
+    """
+    A, b = _as_system(A, B)
+    return _iterate(_jacobi_steps(A, b), b, tolerance, max_iterations, criterion, A)
+
+
+def gauss_seidel_iterations(A, B, tolerance=0.00001, max_iterations=100, criterion="step"):
+    """
+    Gauss-Seidel method as a generator of (iteration, x, residual) - x is the solver's working
+    vector, copy it to keep it past the next iteration. With criterion="step" the residual is
+    None except for the final iterate.
+    """
+    A, b = _as_system(A, B)
+    steps = _gauss_seidel_steps(A, b, criterion == "residual")
+    return _iterate(steps, b, tolerance, max_iterations, criterion, A)
+
+
+def _run(iterations, history, keep, callback):
+    """
+    Consume a solver generator into an IterationHistory, calling callback(iteration, x, residual)
+    on every iteration
+    :return: (history, number of iterations)
+    """
+    results = IterationHistory(history, keep)
+    iteration, x, residual = 0, None, None
+    for iteration, x, residual in iterations:
+        results.record(iteration, x, residual)
+        if callback is not None:
+            callback(iteration, x, residual)
+    results.finish(iteration, x, residual)
+    return results, iteration
+
+
+def jacobi_method(A, B, tolerance=0.00001, max_iterations=100, criterion="step",
+                  history="all", keep=1, callback=None):
+    return _run(jacobi_iterations(A, B, tolerance, max_iterations, criterion), history, keep, callback)
+
+
+def gauss_seidel_method(A, B, tolerance=0.00001, max_iterations=100, criterion="step",
+                        history="all", keep=1, callback=None):
+    return _run(gauss_seidel_iterations(A, B, tolerance, max_iterations, criterion), history, keep, callback)
+
+
+def sor_iterations(A, B, tolerance=0.00001, max_iterations=100, criterion="step", omega=None):
+    """
+    Successive over-relaxation as a generator of (iteration, x, residual),
+    omega=None estimates the optimal relaxation factor. With criterion="step" the residual is
+    None except for the final iterate.
+    """
+    A, b = _as_system(A, B)
+    if omega is None:
+        omega = estimate_sor_omega(A)
+    return _iterate(_sor_steps(A, b, omega, criterion == "residual"), b, tolerance, max_iterations, criterion, A)
+
+
+def ssor_iterations(A, B, tolerance=0.00001, max_iterations=100, criterion="step", omega=None):
+    """
+    Symmetric SOR (forward and backward sweep) as a generator of (iteration, x, residual).
+    With criterion="step" the residual is None except for the final iterate.
+    """
+    A, b = _as_system(A, B)
+    if omega is None:
+        omega = estimate_sor_omega(A)
+    return _iterate(_ssor_steps(A, b, omega, criterion == "residual"), b, tolerance, max_iterations, criterion, A)
+
+
+def conjugate_gradient_iterations(A, B, tolerance=0.00001, max_iterations=100, criterion="step",
+                                  preconditioner=None):
+    """
+    Preconditioned Conjugate Gradient for symmetric positive definite matrices,
+    as a generator of (iteration, x, residual)
+    :param preconditioner: None, "jacobi" or "ilu0"
+    """
+    A, b = _as_system(A, B, check_diagonal=False)
+    return _iterate(_conjugate_gradient_steps(A, b, preconditioner), b, tolerance, max_iterations, criterion, A)
+
+
+def gmres_iterations(A, B, tolerance=0.00001, max_iterations=100, criterion="step",
+                     preconditioner=None, restart=30):
+    """
+    Restarted GMRES(restart) with right preconditioning, as a generator of (iteration, x, residual)
+    :param preconditioner: None, "jacobi" or "ilu0"
+    """
+    A, b = _as_system(A, B, check_diagonal=False)
+    restart = min(restart, len(b))
+    return _iterate(_gmres_steps(A, b, preconditioner, restart), b, tolerance, max_iterations, criterion, A)
+
+
+def sor_method(A, B, tolerance=0.00001, max_iterations=100, criterion="step",
+               history="all", keep=1, callback=None, omega=None):
+    return _run(sor_iterations(A, B, tolerance, max_iterations, criterion, omega), history, keep, callback)
+
+
+def ssor_method(A, B, tolerance=0.00001, max_iterations=100, criterion="step",
+                history="all", keep=1, callback=None, omega=None):
+    return _run(ssor_iterations(A, B, tolerance, max_iterations, criterion, omega), history, keep, callback)
+
+
+def conjugate_gradient_method(A, B, tolerance=0.00001, max_iterations=100, criterion="step",
+                              history="all", keep=1, callback=None, preconditioner=None):
+    return _run(conjugate_gradient_iterations(A, B, tolerance, max_iterations, criterion, preconditioner),
+                history, keep, callback)
+
+
+def gmres_method(A, B, tolerance=0.00001, max_iterations=100, criterion="step",
+                 history="all", keep=1, callback=None, preconditioner=None, restart=30):
+    return _run(gmres_iterations(A, B, tolerance, max_iterations, criterion, preconditioner, restart),
+                history, keep, callback)
+
+
+ITERATIVE_METHODS = {
+    "jacobi": jacobi_method,
+    "gauss_seidel": gauss_seidel_method,
+    "sor": sor_method,
+    "ssor": ssor_method,
+    "cg": conjugate_gradient_method,
+    "gmres": gmres_method,
+}
+
+
+def solve_iterative(method, A, B, tolerance=0.00001, max_iterations=100, **options):
+    """
+    Run an iterative method by name
+    :param method: A key of ITERATIVE_METHODS
+    :param options: Extra keyword arguments of the method (criterion, history, omega, preconditioner...)
+    :return: (history, number of iterations)
+    """
+    if method not in ITERATIVE_METHODS:
+        raise ValueError(f"Unknown iterative method {method!r}, choose one of {list(ITERATIVE_METHODS)}.")
+    return ITERATIVE_METHODS[method](A, B, tolerance, max_iterations, **options)
 
 
 def display_results(method_name, results, iterations):
     print(f"\n{method_name} Results:")
-    for i, result in enumerate(results, 1):
+    numbered = results.items() if isinstance(results, IterationHistory) else enumerate(results, 1)
+    for i, result in numbered:
         print(f"Iteration {i}: {result}")
     print(f"Total iterations: {iterations}")
 
@@ -82,23 +858,27 @@ def display_results(method_name, results, iterations):
 def main():
     matrixA = [[4, 2, 0], [2, 10, 4], [0, 4, 5]]
     vectorB = [[2], [6], [5]]
-    matrixA_processed, vectorB_processed = process_matrix(matrixA, vectorB)
+    with Trace.tracing(Trace.print_sink):
+        matrixA_processed, vectorB_processed = process_matrix(matrixA, vectorB)
     if not matrixA_processed:
         print("Exiting: The matrix cannot be made diagonally dominant.")
         return
+    methods = [("Jacobi Method", "jacobi"), ("Gauss-Seidel Method", "gauss_seidel"), ("SOR Method", "sor"),
+               ("Conjugate Gradient Method", "cg"), ("GMRES Method", "gmres")]
     while True:
         print("\nChoose a method:")
-        print("1. Jacobi Method")
-        print("2. Gauss-Seidel Method")
-        print("3. Exit")
-        choice = input("Enter your choice (1/2/3): ").strip()
-
-        if choice == "1":
-            results, iterations = jacobi_method(matrixA_processed, vectorB_processed)
-            display_results("Jacobi Method", results, iterations)
-        elif choice == "2":
-            results, iterations = gauss_seidel_method(matrixA_processed, vectorB_processed)
-            display_results("Gauss-Seidel Method", results, iterations)
+        for number, (name, _) in enumerate(methods, 1):
+            print(f"{number}. {name}")
+        print(f"{len(methods) + 1}. Exit")
+        choice = input(f"Enter your choice (1-{len(methods) + 1}): ").strip()
+
+        if choice == str(len(methods) + 1):
+            break
+        if choice.isdigit() and 1 <= int(choice) <= len(methods):
+            name, method = methods[int(choice) - 1]
+            results, iterations = solve_iterative(method, matrixA_processed, vectorB_processed)
+            display_results(name, results, iterations)
+
 
 if __name__ == "__main__":
     main()
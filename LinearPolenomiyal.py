@@ -1,34 +1,61 @@
+import Trace
+from GausZaidelJacobi import gauss_seidel_method
 from MatrixUtility import *
 
-def linearInterpolation(table_points, point):
+LINEAR_EXTRAPOLATION = ("linear", "constant", "nan", "raise")
+
+
+def piecewiseLinear(x_data, y_data, x, left="linear", right="linear"):
+    """
+    Piecewise linear interpolation on sorted, arbitrary x-values
+    :param x_data: Increasing x-values of the table
+    :param y_data: y-values of the table
+    :param x: Value or array of values to interpolate
+    :param left: Below x_data[0] - "linear" continues the first segment, "constant" holds y_data[0],
+                 "nan" returns nan, "raise" raises ValueError
+    :param right: Above x_data[-1], same options using the last segment
+    :return: Interpolated value(s) in the shape of x
+    """
+    for policy in (left, right):
+        if policy not in LINEAR_EXTRAPOLATION:
+            raise ValueError(f"Unknown extrapolation {policy!r}, use one of {LINEAR_EXTRAPOLATION}.")
+    x_data = np.asarray(x_data, dtype=float)
+    y_data = np.asarray(y_data, dtype=float)
+    if len(x_data) < 2:
+        raise ValueError("At least two table points are required.")
+    x = np.asarray(x, dtype=float)
+
+    # Binary search for the segment, clipped so the end segments serve the extrapolation
+    segment = np.clip(np.searchsorted(x_data, x, side="right") - 1, 0, len(x_data) - 2)
+    slope = (y_data[segment + 1] - y_data[segment]) / (x_data[segment + 1] - x_data[segment])
+    result = np.asarray(y_data[segment] + slope * (x - x_data[segment]))
+
+    for policy, outside, edge in ((left, x < x_data[0], y_data[0]), (right, x > x_data[-1], y_data[-1])):
+        if policy == "linear" or not np.any(outside):
+            continue
+        if policy == "raise":
+            raise ValueError(f"Point outside the table range [{x_data[0]}, {x_data[-1]}].")
+        result[outside] = edge if policy == "constant" else np.nan
+    return float(result) if result.ndim == 0 else result
+
+
+def linearInterpolation(table_points, point, left="linear", right="linear"):
     """
     Linear interpolation and extrapolation function.
-    :param table_points: List of data points
-    :param point: Value to interpolate or extrapolate
+    :param table_points: List of data points, sorted by x
+    :param point: Value (or array of values) to interpolate or extrapolate
+    :param left: Extrapolation policy below the table, see piecewiseLinear
+    :param right: Extrapolation policy above the table, see piecewiseLinear
     :return: Interpolation or extrapolation result
     """
-    p = []
-    result = 0
-    flag = 1
-    for i in range(len(table_points)):
-        p.append(table_points[i][0])
-    for i in range(len(p) - 1):
-        if i <= point <= i + 1:
-            x1 = table_points[i][0]
-            x2 = table_points[i + 1][0]
-            y1 = table_points[i][1]
-            y2 = table_points[i + 1][1]
-            result = (((y1 - y2) / (x1 - x2)) * point) + ((y2 * x1) - (y1 * x2)) / (x1 - x2)
-            print("\nThe approximation (interpolation) of the point ", point, " is: ", round(result, 4))
-            flag = 0
-    if flag:
-        x1 = table_points[0][0]
-        x2 = table_points[1][0]
-        y1 = table_points[0][1]
-        y2 = table_points[1][1]
-        m = (y1 - y2) / (x1 - x2)
-        result = y1 + m * (point - x1)
-        print("\nThe approximation (extrapolation) of the point ", point, " is: ", round(result, 4))
+    x_data = [p[0] for p in table_points]
+    y_data = [p[1] for p in table_points]
+    result = piecewiseLinear(x_data, y_data, point, left, right)
+    if Trace.enabled and np.ndim(point) == 0:
+        kind = "interpolation" if x_data[0] <= point <= x_data[-1] else "extrapolation"
+        Trace.emit("LinearPolenomiyal", kind,
+                   f"\nThe approximation ({kind}) of the point  {point}  is:  {round(result, 4)}",
+                   x=point, result=result)
     return result
 
 
@@ -37,10 +64,12 @@ def GaussJordanElimination(matrix, vector):
     Function for solving a linear equation using Gauss's elimination method
     :param matrix: Matrix nxn
     :param vector: Vector n
-    :return: Solve Ax=b -> x=A(-1)b
+    :return: Solve Ax=b -> x=A(-1)b, None if the matrix is singular
     """
     matrix, vector = RowXchange(matrix, vector)
     invert = InverseMatrix(matrix, vector)
+    if invert is None:
+        return None
     return MulMatrixVector(invert, vector)
 
 
@@ -81,53 +110,148 @@ def SolveLU(matrix, vector):
     Function for solving a linear equation by LU decomposition
     :param matrix: Matrix nxn
     :param vector: Vector n
-    :return: Solve Ax=b -> x=U(-1)L(-1)b
+    :return: Solve Ax=b -> Ly=Pb, Ux=y by substitution
     """
-    matrixU = UMatrix(matrix, vector)
-    matrixL = LMatrix(matrix, vector)
-    return MultiplyMatrix(InverseMatrix(matrixU), MultiplyMatrix(InverseMatrix(matrixL), vector))
+    return LUFactorization(matrix).solve(vector)
 
 
-def solveMatrix(matrixA, vectorb):
-    detA = Determinant(matrixA, 1)
-    print("\nDET(A) =", detA)
+def solveMatrix(matrixA, vectorb, return_path=False):
+    """
+    Solve Ax=b with the cheapest solver that fits the structure of A, checked in this order:
+    triangular - substitution, O(n^2)
+    banded (lower + upper bandwidth < n/4) - Thomas algorithm for a diagonally dominant tridiagonal matrix,
+        otherwise band elimination with partial pivoting
+    symmetric positive definite - Cholesky
+    strictly diagonally dominant - Gauss-Seidel, limited to the sweeps that cost less than LU,
+        falls back to LU if it has not converged by then
+    otherwise - LU with partial pivoting
+    :param matrixA: Matrix nxn
+    :param vectorb: Vector n (or n x k matrix of right-hand sides)
+    :param return_path: Also return the name of the solver used
+    :return: Solution in the shape of vectorb, or (solution, path)
+    """
+    A = as_array(matrixA, dtype=float)
+    result, path = _structuredSolve(A, vectorb)
+    if result is None:
+        result, path = _luSolve(matrixA, vectorb), "lu"
+    if Trace.enabled:
+        Trace.emit("LinearPolenomiyal", "solve_path", f"\nSolver: {path}", path=path)
+    if return_path:
+        return result, path
+    return result
+
 
-    if detA != 0:
-        print("\nNon-Singular Matrix - Perform GaussJordanElimination")
-        result = GaussJordanElimination(matrixA, vectorb)
-        print(result)
+def _structuredSolve(A, vectorb):
+    """
+    :return: (solution, path), or (None, None) when only LU fits
+    """
+    n = len(A)
+    b = np.asarray(vectorb, dtype=float)
+    lower, upper = Bandwidth(A)
+    if lower == 0 or upper == 0:
+        if not np.any(SingularPivot(np.diag(A), RowScale(A), n)):
+            return TriangularSolve(A, b, lower=upper == 0), "triangular"
+    elif lower + upper < n // 4:
+        if lower == upper == 1 and is_diagonally_dominant(A):
+            factors = tridiagonal_factor(np.append(0, np.diag(A, -1)), np.diag(A), np.append(np.diag(A, 1), 0))
+            return tridiagonal_solve(factors, b).reshape(b.shape), "tridiagonal"
+        x = BandSolve(A, b, lower, upper)
+        if x is not None:
+            return x, "banded"
+    elif np.all(np.diag(A) > 0) and np.array_equal(A, A.T):
+        L = CholeskyFactor(A)
+        if L is not None:
+            return CholeskySolve(L, b), "cholesky"
+    elif b.size == n and is_diagonally_dominant(A):
+        # A dense sweep costs about 2n^2 operations and LU about 2n^3/3
+        history, _ = gauss_seidel_method(A, b.reshape(-1), 1e-12, max(10, n // 3), criterion="residual",
+                                         history="last")
+        if history.residuals[-1] <= 1e-12 * np.max(np.abs(b)):
+            return history.values[-1].reshape(b.shape), "iterative"
+    return None, None
+
+
+def _luSolve(matrixA, vectorb):
+    # Factor once - the same factorization gives the determinant and the solution
+    factors = LUFactor(matrixA)
+    if Trace.enabled:
+        detA = LUDeterminant(matrixA, factors)
+        Trace.emit("LinearPolenomiyal", "determinant", f"\nDET(A) = {detA}", det=detA)
+
+    if not IsSingularLU(factors):
+        result = LUSolve(factors, vectorb)
+        if Trace.enabled:
+            Trace.emit("LinearPolenomiyal", "lu_solve", f"\nNon-Singular Matrix - Perform LU substitution\n{result}",
+                       matrix=result)
         return result
     else:
-        print("Singular Matrix - Perform LU Decomposition\n")
-        print("Matrix U:\n", UMatrix(matrixA, vectorb))
-        print("\nMatrix L:\n", LMatrix(matrixA, vectorb))
-        print("\nMatrix A=LU:\n", MultiplyMatrix(LMatrix(matrixA, vectorb), UMatrix(matrixA, vectorb)))
-        return MultiplyMatrix(LMatrix(matrixA, vectorb), UMatrix(matrixA, vectorb))
+        U, L = UMatrix(matrixA, vectorb), LMatrix(matrixA, vectorb)
+        result = MultiplyMatrix(L, U)
+        if Trace.enabled:
+            Trace.emit("LinearPolenomiyal", "lu_decomposition",
+                       f"Singular Matrix - Perform LU Decomposition\n\nMatrix U:\n {U}\n\nMatrix L:\n {L}"
+                       f"\n\nMatrix A=LU:\n {result}", matrix=result, U=U, L=L)
+        return result
 
 
-def polynomialInterpolation(table_points, x):
+def dividedDifferences(x_data, y_data):
     """
-    Polynomial interpolation function
-    :param table_points: List of data points
-    :param x: Value to interpolate
-    :return: Interpolation result
+    Newton divided-difference coefficients, O(n^2)
+    :param x_data: Distinct x-values of the data points
+    :param y_data: y-values of the data points
+    :return: Coefficients c, P(x) = c0 + c1(x-x0) + c2(x-x0)(x-x1) + ...
     """
-    matrix = [[point[0] ** i for i in range(len(table_points))] for point in table_points]
-    b = [[point[1]] for point in table_points]
+    x_data = np.asarray(x_data, dtype=float)
+    coefficients = np.array(y_data, dtype=float)
+    # Column j of the divided-difference table, computed in place
+    for j in range(1, len(x_data)):
+        coefficients[j:] = (coefficients[j:] - coefficients[j - 1:-1]) / (x_data[j:] - x_data[:-j])
+    return coefficients
 
-    print("The matrix obtained from the points:\n", matrix)
-    print("\nb vector:\n", b)
 
-    matrixSol = solveMatrix(matrix, b)
-    result = sum([matrixSol[i][0] * (x ** i) for i in range(len(matrixSol))])
+def newtonPolynomial(coefficients, x_data, x):
+    """
+    Evaluation of the Newton form by Horner's scheme, O(n) per point
+    :param coefficients: Coefficients from dividedDifferences
+    :param x_data: x-values of the data points
+    :param x: Value or array of values
+    :return: P(x) in the shape of x
+    """
+    x = np.asarray(x, dtype=float)
+    result = np.full(x.shape, coefficients[-1])
+    for k in range(len(coefficients) - 2, -1, -1):
+        result = result * (x - x_data[k]) + coefficients[k]
+    return float(result) if result.ndim == 0 else result
+
+
+def polynomialInterpolation(table_points, x, return_coefficients=False):
+    """
+    Polynomial interpolation function (Newton divided differences)
+    :param table_points: List of data points
+    :param x: Value (or array of values) to interpolate
+    :param return_coefficients: Also return the coefficients, to evaluate again with newtonPolynomial
+    :return: Interpolation result, or (result, coefficients)
+    """
+    x_data = [point[0] for point in table_points]
+    y_data = [point[1] for point in table_points]
+    coefficients = dividedDifferences(x_data, y_data)
+    result = newtonPolynomial(coefficients, x_data, x)
 
-    print("\nThe polynomial:")
-    print('P(X) = ' + ' + '.join([f"({matrixSol[i][0]}) * x^{i}" for i in range(len(matrixSol))]))
-    print(f"\nThe result of P(X={x}) is:", result)
+    if Trace.enabled:
+        terms = [f"({coefficients[0]})"]
+        for i in range(1, len(coefficients)):
+            terms.append(f"({coefficients[i]})" + "".join(f" * (x - {x_data[k]})" for k in range(i)))
+        Trace.emit("LinearPolenomiyal", "newton_polynomial",
+                   f"The divided differences obtained from the points:\n {coefficients}\n\nThe polynomial:\n"
+                   f"P(X) = {' + '.join(terms)}\n\nThe result of P(X={x}) is: {result}",
+                   matrix=coefficients, result=result)
+    if return_coefficients:
+        return result, coefficients
     return result
 
 
 if __name__ == '__main__':
+    Trace.enable(Trace.print_sink)
     table_points = [(0, 0), (1, 0.8415), (2, 0.9093), (3, 0.1411), (4, -0.7568), (5, -0.9589), (6, -0.2794)]
     x = 1.28
 
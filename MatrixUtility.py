@@ -1,4 +1,8 @@
 import numpy as np
+
+import Trace
+
+
 def print_matrix(matrix):
     for row in matrix:
         for element in row:
@@ -7,31 +11,41 @@ def print_matrix(matrix):
     print()
 
 
+def as_array(matrix, dtype=None):
+    """
+    View of a matrix as an ndarray, lists are converted and arrays are used without copying
+    :param matrix: Matrix as nested lists or ndarray
+    :param dtype: Optional dtype, an array is copied only if its dtype differs
+    :return: ndarray
+    """
+    return np.asarray(matrix, dtype=dtype)
+
+
+def _swap(rows, i, j):
+    # A tuple swap of two ndarray rows swaps views and duplicates one row, so index them together
+    if isinstance(rows, np.ndarray):
+        rows[[i, j]] = rows[[j, i]]
+    else:
+        rows[i], rows[j] = rows[j], rows[i]
+
+
 def MaxNorm(matrix):
     """
     Function for calculating the max-norm of a matrix
     :param matrix: Matrix nxn
     :return:max-norm of a matrix
     """
-    max_norm = 0
-    for i in range(len(matrix)):
-        norm = 0
-        for j in range(len(matrix)):
-            # Sum of organs per line with absolute value
-            norm += abs(matrix[i][j])
-        # Maximum row amount
-        if norm > max_norm:
-            max_norm = norm
-
-    return max_norm
+    # Maximum over the rows of the sum of absolute values, of the square part [:n, :n] only
+    # (an augmented n x (n+1) matrix is measured without its right-hand side)
+    matrix = as_array(matrix)
+    n = len(matrix)
+    if n == 0:
+        return 0
+    return np.max(np.sum(np.abs(matrix[:, :n]), axis=1))
 
 #  swapping between row i to row j in the matrix
 def swap_row(mat, i, j):
-    N = len(mat)
-    for k in range(N + 1):
-        temp = mat[i][k]
-        mat[i][k] = mat[j][k]
-        mat[j][k] = temp
+    _swap(mat, i, j)
 
 
 def is_diagonally_dominant(mat):
@@ -54,36 +68,122 @@ def is_square_matrix(mat):
     return True
 
 
+def DominanceMargins(matrix):
+    """
+    Relative dominance margin of every row as the pivot of every column, O(n^2)
+    :param matrix: Matrix nxn
+    :return: n x n array, margins[i][j] = (|a_ij| - sum of the other |a_ik|) / sum of all |a_ik|, in [-1, 1] -
+             row i placed at position j is strictly dominant exactly when margins[i][j] > 0
+    """
+    A = np.abs(as_array(matrix, dtype=float))
+    row_sums = np.sum(A, axis=1, keepdims=True)
+    # A zero row cannot dominate anywhere
+    return np.divide(2 * A - row_sums, row_sums, out=np.full(A.shape, -1.0), where=row_sums > 0)
+
+
+def _assignment(cost):
+    """
+    Minimum cost assignment (Hungarian method with potentials and shortest augmenting paths), O(n^3)
+    :param cost: n x n cost array
+    :return: Array column[i] - the column assigned to row i
+    """
+    n = len(cost)
+    u = np.zeros(n + 1)
+    v = np.zeros(n + 1)
+    # Columns and rows are 1-based here, column 0 is the virtual start of each augmenting path
+    row_of = np.zeros(n + 1, dtype=int)
+    way = np.zeros(n + 1, dtype=int)
+    for i in range(1, n + 1):
+        row_of[0] = i
+        j0 = 0
+        min_reduced = np.full(n + 1, np.inf)
+        used = np.zeros(n + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = row_of[j0]
+            free = ~used
+            free[0] = False
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (reduced < min_reduced[1:])
+            min_reduced[1:][better] = reduced[better]
+            way[1:][better] = j0
+            j1 = 1 + int(np.argmin(np.where(free[1:], min_reduced[1:], np.inf)))
+            delta = min_reduced[j1]
+            u[row_of[used]] += delta
+            v[used] -= delta
+            min_reduced[free] -= delta
+            j0 = j1
+            if row_of[j0] == 0:
+                break
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            row_of[j0] = row_of[j1]
+            j0 = j1
+    column = np.empty(n, dtype=int)
+    column[row_of[1:] - 1] = np.arange(n)
+    return column
+
+
+def DominantPermutation(matrix):
+    """
+    Row ordering with the most dominant diagonal, found as a weighted bipartite assignment of rows to
+    diagonal positions in O(n^3). Orderings are ranked first by the number of rows that are not strictly
+    dominant, then by the sum of the relative margins (DominanceMargins), so a strictly dominant ordering
+    is found whenever one exists.
+    :param matrix: Matrix nxn
+    :return: (perm, dominant) - perm[k] is the original row placed at row k,
+             dominant tells whether the reordered matrix is strictly diagonally dominant
+    """
+    margins = DominanceMargins(matrix)
+    n = len(margins)
+    if n == 0:
+        return np.arange(0), True
+    # One non-dominant row outweighs any difference in the margin sum, which is below 2n
+    penalty = 2 * n + 1
+    column = _assignment(-(margins - penalty * (margins <= 0)))
+    perm = np.empty(n, dtype=int)
+    perm[column] = np.arange(n)
+    return perm, bool(np.all(margins[perm, np.arange(n)] > 0))
+
+
+def PermuteRows(rows, perm):
+    """
+    Reorder rows of a matrix or vector, new row k is old row perm[k]
+    :param rows: ndarray or list
+    :return: Reordered copy of the same type
+    """
+    if isinstance(rows, np.ndarray):
+        return rows[perm]
+    return [rows[i] for i in perm]
+
+
+def ReorderDominant(matrix, vector=None):
+    """
+    Reorder the rows of A (and b) for the most dominant diagonal, see DominantPermutation
+    :param matrix: Matrix nxn
+    :param vector: Optional right-hand side, reordered with the same permutation
+    :return: (matrix, vector, perm, dominant)
+    """
+    perm, dominant = DominantPermutation(matrix)
+    if vector is not None:
+        vector = PermuteRows(vector, perm)
+    return PermuteRows(matrix, perm), vector, perm, dominant
+
+
 def reorder_dominant_diagonal(matrix):
-    n = len(matrix)
-    permutation = np.argsort(np.diag(matrix))[::-1]
-    reordered_matrix = matrix[permutation][:, permutation]
-    return reordered_matrix
+    return ReorderDominant(matrix)[0]
 
 
 def DominantDiagonalFix(matrix):
     """
     Function to change a matrix to create a dominant diagonal
     :param matrix: Matrix nxn
-    :return: Change the matrix to a dominant diagonal
+    :return: The rows reordered for a dominant diagonal, or for the most dominant one if none exists
     """
-    #Check if we have a dominant for each column
-    dom = [0]*len(matrix)
-    result = list()
-   # Find the largest organ in a row
-    for i in range(len(matrix)):
-        for j in range(len(matrix[0])):
-            if (matrix[i][j] > sum(map(abs,map(int,matrix[i])))-matrix[i][j]) :
-                dom[i]=j
-    for i in range(len(matrix)):
-        result.append([])
-        # Cannot dominant diagonal
-        if i not in dom:
-            print("Couldn't find dominant diagonal.")
-            return matrix
-    # Change the matrix to a dominant diagonal
-    for i,j in enumerate(dom):
-        result[j]=(matrix[i])
+    result, _, _, dominant = ReorderDominant(matrix)
+    if not dominant and Trace.enabled:
+        Trace.emit("MatrixUtility", "dominant_diagonal", "Couldn't find dominant diagonal.", matrix=result)
     return result
 
 
@@ -95,17 +195,10 @@ def swap_rows_elementary_matrix(n, row1, row2):
 
 
 def matrix_multiply(A, B):
-    if len(A[0]) != len(B):
+    A, B = as_array(A), as_array(B)
+    if A.shape[-1] != B.shape[0]:
         raise ValueError("Matrix dimensions are incompatible for multiplication.")
-
-    result = [[0 for _ in range(len(B[0]))] for _ in range(len(A))]
-
-    for i in range(len(A)):
-        for j in range(len(B[0])):
-            for k in range(len(B)):
-                result[i][j] += A[i][k] * B[k][j]
-
-    return np.array(result)
+    return A @ B
 
 
 def row_addition_elementary_matrix(n, target_row, source_row, scalar=1.0):
@@ -135,9 +228,9 @@ def scalar_multiplication_elementary_matrix(n, row_index, scalar):
 
     return np.array(elementary_matrix)
 
-def Determinant(matrix, mul):
+def CofactorDeterminant(matrix, mul):
     """
-    Recursive function for determinant calculation
+    Recursive function for determinant calculation (cofactor expansion, O(n!))
     :param matrix: Matrix nxn
     :param mul: The double number
     :return: determinant of matrix
@@ -160,9 +253,433 @@ def Determinant(matrix, mul):
             # Change the sign of the multiply number
             sign *= -1
             #  Recursive call for determinant calculation
-            det = det + mul * Determinant(m, sign * matrix[0][i])
+            det = det + mul * CofactorDeterminant(m, sign * matrix[0][i])
     return det
 
+def RowScale(matrix):
+    """
+    Largest absolute value of every row, the scale the pivots are measured against
+    :param matrix: Matrix nxn
+    :return: Vector n
+    """
+    A = as_array(matrix, dtype=float)
+    if A.size == 0:
+        return np.zeros(len(A))
+    return np.max(np.abs(A), axis=1)
+
+
+def SingularPivot(pivot, scale, n, tol=None):
+    """
+    The singularity rule of every elimination in this module: a pivot is zero when it is within round-off of
+    the scale of its original row, |pivot| <= tol * max|a_ij|, so scaling a row of A does not change the verdict
+    :param pivot: Pivot value (or array of pivots)
+    :param scale: RowScale of the original row the pivot comes from
+    :param n: Matrix size
+    :param tol: Relative threshold, by default n * eps, 0 accepts any nonzero pivot
+    :return: True (or boolean array) where the pivot counts as zero
+    """
+    if tol is None:
+        tol = n * np.finfo(float).eps
+    return np.abs(pivot) <= tol * scale
+
+
+def LUFactor(matrix):
+    """
+    Partial-pivot LU factorization PA = LU, packed into a single array
+    :param matrix: Matrix nxn (list of lists or numpy array)
+    :return: (lu, piv, sign, scale) - L below the diagonal (unit diagonal implied), U on and above it,
+             piv[i] is the original row placed at row i, sign is the parity of the permutation,
+             scale[i] is the RowScale of that original row, for IsSingularLU
+    """
+    lu = np.array(matrix, dtype=float)
+    scale = RowScale(lu)
+    n = len(lu)
+    piv = np.arange(n)
+    sign = 1.0
+    for k in range(n):
+        # Pivot row - the largest absolute value in the current column
+        p = k + int(np.argmax(np.abs(lu[k:, k])))
+        if p != k:
+            lu[[k, p]] = lu[[p, k]]
+            piv[[k, p]] = piv[[p, k]]
+            sign = -sign
+        if lu[k, k] != 0:
+            lu[k + 1:, k] /= lu[k, k]
+            lu[k + 1:, k + 1:] -= np.outer(lu[k + 1:, k], lu[k, k + 1:])
+    return lu, piv, sign, scale[piv]
+
+
+def IsSingularLU(factors, tol=None):
+    """
+    Check the pivots of an LU factorization for singularity, by the rule of SingularPivot
+    :param factors: (lu, piv, sign, scale) from LUFactor
+    :param tol: Relative threshold, by default n * eps - pivot k counts as zero when |u_kk| <= tol * scale[k],
+                the largest entry of its original row of A. 0 only flags exactly zero pivots.
+    :return: True if some pivot is zero
+    """
+    lu, scale = factors[0], factors[3]
+    if len(lu) == 0:
+        return False
+    return bool(np.any(SingularPivot(np.diag(lu), scale, len(lu), tol)))
+
+
+def LUDeterminant(matrix, factors=None):
+    """
+    Determinant calculation from a partial-pivot LU factorization, O(n^3)
+    :param matrix: Matrix nxn
+    :param factors: Optional (lu, piv, sign, scale) from LUFactor, reused instead of factoring again
+    :return: determinant of matrix (0.0 when a pivot vanishes up to round-off, see IsSingularLU)
+    """
+    if factors is None:
+        factors = LUFactor(matrix)
+    if IsSingularLU(factors):
+        return 0.0
+    lu, piv, sign, scale = factors
+    return float(sign * np.prod(np.diag(lu)))
+
+
+def SignLogDet(matrix, factors=None):
+    """
+    Sign and log of the absolute determinant, safe from overflow for large or ill-scaled matrices
+    :param matrix: Matrix nxn
+    :param factors: Optional (lu, piv, sign, scale) from LUFactor
+    :return: (sign, log|det|) - (0.0, -inf) for a singular matrix (see IsSingularLU)
+    """
+    if factors is None:
+        factors = LUFactor(matrix)
+    if IsSingularLU(factors):
+        return 0.0, -np.inf
+    lu, piv, sign, scale = factors
+    diag = np.diag(lu)
+    sign = sign * np.prod(np.sign(diag))
+    return float(sign), float(np.sum(np.log(np.abs(diag))))
+
+
+def LUSolve(factors, vector):
+    """
+    Solve Ax=b with an existing LU factorization by forward and back substitution, O(n^2)
+    :param factors: (lu, piv, sign, scale) from LUFactor
+    :param vector: Vector n (or n x k matrix of right-hand sides)
+    :return: Solution in the shape of vector
+    """
+    lu, piv = factors[:2]
+    n = len(lu)
+    b = np.asarray(vector, dtype=float)
+    # Apply the row permutation, then L y = Pb
+    y = b[piv].copy()
+    for i in range(1, n):
+        y[i] -= lu[i, :i] @ y[:i]
+    # U x = y
+    for i in range(n - 1, -1, -1):
+        y[i] = (y[i] - lu[i, i + 1:] @ y[i + 1:]) / lu[i, i]
+    return y
+
+
+def LUSolveTranspose(factors, vector):
+    """
+    Solve (A^T)x=b with an existing LU factorization of A, O(n^2)
+    :param factors: (lu, piv, sign, scale) from LUFactor
+    :param vector: Vector n (or n x k matrix of right-hand sides)
+    :return: Solution in the shape of vector
+    """
+    lu, piv = factors[:2]
+    n = len(lu)
+    z = np.array(vector, dtype=float)
+    # A^T = U^T L^T P, first U^T z = b
+    for i in range(n):
+        z[i] = (z[i] - lu[:i, i] @ z[:i]) / lu[i, i]
+    # L^T w = z
+    for i in range(n - 2, -1, -1):
+        z[i] -= lu[i + 1:, i] @ z[i + 1:]
+    # x = P^T w
+    x = np.empty_like(z)
+    x[piv] = z
+    return x
+
+
+def Bandwidth(matrix):
+    """
+    Lower and upper bandwidth of a matrix, O(n^2)
+    :param matrix: Matrix nxn
+    :return: (lower, upper) - A[i][j] == 0 whenever i - j > lower or j - i > upper
+    """
+    rows, cols = np.nonzero(as_array(matrix))
+    if len(rows) == 0:
+        return 0, 0
+    offsets = cols - rows
+    return int(max(0, -offsets.min())), int(max(0, offsets.max()))
+
+
+def TriangularSolve(matrix, vector, lower=False):
+    """
+    Solve Ax=b for a triangular A by substitution, O(n^2)
+    :param matrix: Upper (or lower) triangular matrix nxn, the other triangle is not read
+    :param vector: Vector n (or n x k matrix of right-hand sides)
+    :param lower: True for forward substitution with a lower triangular matrix
+    :return: Solution in the shape of vector
+    """
+    A = as_array(matrix, dtype=float)
+    x = np.array(vector, dtype=float)
+    n = len(A)
+    if lower:
+        for i in range(n):
+            x[i] = (x[i] - A[i, :i] @ x[:i]) / A[i, i]
+    else:
+        for i in range(n - 1, -1, -1):
+            x[i] = (x[i] - A[i, i + 1:] @ x[i + 1:]) / A[i, i]
+    return x
+
+
+def BandSolve(matrix, vector, lower, upper):
+    """
+    Solve Ax=b for a banded A by partial-pivot elimination restricted to the band, O(n * lower * (lower + upper))
+    :param matrix: Matrix nxn with the bandwidths (lower, upper), see Bandwidth
+    :param vector: Vector n (or n x k matrix of right-hand sides)
+    :return: Solution in the shape of vector, None if the matrix is singular
+    """
+    A = np.array(matrix, dtype=float)
+    x = np.array(vector, dtype=float)
+    n = len(A)
+    scale = RowScale(A)
+    # Row swaps within the lower band widen the upper band of U to lower + upper
+    width = lower + upper
+    for k in range(n):
+        last = min(n, k + lower + 1)
+        end = min(n, k + width + 1)
+        p = k + int(np.argmax(np.abs(A[k:last, k])))
+        if SingularPivot(A[p, k], scale[p], n):
+            return None
+        if p != k:
+            A[[k, p], k:end] = A[[p, k], k:end]
+            x[[k, p]] = x[[p, k]]
+            scale[[k, p]] = scale[[p, k]]
+        factors = A[k + 1:last, k] / A[k, k]
+        A[k + 1:last, k:end] -= np.outer(factors, A[k, k:end])
+        x[k + 1:last] -= np.multiply.outer(factors, x[k])
+    for k in range(n - 1, -1, -1):
+        end = min(n, k + width + 1)
+        x[k] = (x[k] - A[k, k + 1:end] @ x[k + 1:end]) / A[k, k]
+    return x
+
+
+def tridiagonal_factor(lower, diagonal, upper):
+    """
+    Forward elimination of a tridiagonal matrix (Thomas algorithm) in O(n), without pivoting
+    :param lower: lower[i] multiplies x[i-1] in row i (lower[0] is not used)
+    :param diagonal: The main diagonal
+    :param upper: upper[i] multiplies x[i+1] in row i (upper[n-1] is not used)
+    :return: (lower, ratios, pivots) to pass to tridiagonal_solve
+    """
+    lower = [float(value) for value in lower]
+    diagonal = [float(value) for value in diagonal]
+    upper = [float(value) for value in upper]
+    n = len(diagonal)
+    ratios = [0.0] * n
+    pivots = [0.0] * n
+    pivots[0] = diagonal[0]
+    for i in range(1, n):
+        ratios[i - 1] = upper[i - 1] / pivots[i - 1]
+        pivots[i] = diagonal[i] - lower[i] * ratios[i - 1]
+    return lower, ratios, pivots
+
+
+def tridiagonal_solve(factors, rhs):
+    """
+    Forward and back substitution with a factored tridiagonal matrix, O(n)
+    :param factors: The result of tridiagonal_factor
+    :param rhs: Vector n (or n x k matrix of right-hand sides)
+    :return: Solution in the shape of rhs
+    """
+    lower, ratios, pivots = factors
+    n = len(pivots)
+    rhs = np.asarray(rhs, dtype=float)
+    if rhs.ndim == 1:
+        # Plain floats are much faster than numpy scalars in this loop
+        y = rhs.tolist()
+        y[0] /= pivots[0]
+        for i in range(1, n):
+            y[i] = (y[i] - lower[i] * y[i - 1]) / pivots[i]
+        for i in range(n - 2, -1, -1):
+            y[i] -= ratios[i] * y[i + 1]
+        return np.array(y)
+    y = rhs.copy()
+    y[0] /= pivots[0]
+    for i in range(1, n):
+        y[i] -= lower[i] * y[i - 1]
+        y[i] /= pivots[i]
+    for i in range(n - 2, -1, -1):
+        y[i] -= ratios[i] * y[i + 1]
+    return y
+
+
+def CholeskyFactor(matrix):
+    """
+    Cholesky factorization A = L L^T of a symmetric positive definite matrix, n^3/3 operations
+    :param matrix: Symmetric matrix nxn, only the lower triangle is read
+    :return: Lower triangular L, None if A is not positive definite (up to round-off)
+    """
+    A = as_array(matrix, dtype=float)
+    n = len(A)
+    L = np.zeros((n, n))
+    tol = n * np.finfo(float).eps * np.max(np.abs(np.diag(A)), initial=0)
+    for k in range(n):
+        d = A[k, k] - L[k, :k] @ L[k, :k]
+        if d <= tol:
+            return None
+        L[k, k] = np.sqrt(d)
+        L[k + 1:, k] = (A[k + 1:, k] - L[k + 1:, :k] @ L[k, :k]) / L[k, k]
+    return L
+
+
+def CholeskySolve(L, vector):
+    """
+    Solve Ax=b with A = L L^T from CholeskyFactor, O(n^2)
+    :return: Solution in the shape of vector
+    """
+    return TriangularSolve(L.T, TriangularSolve(L, vector, lower=True))
+
+
+def _inverse_norm1_estimate(solve, solve_transpose, n, max_steps=5):
+    """
+    Hager/Higham estimate of ||A(-1)||1 from solves with A and A^T, O(n^2) per step
+    :param solve: Function b -> A(-1)b
+    :param solve_transpose: Function b -> A(-T)b
+    :param n: Matrix size
+    :param max_steps: Maximum number of ascent steps
+    :return: Lower bound of ||A(-1)||1, exact in most cases
+    """
+    x = np.full(n, 1.0 / n)
+    estimate = 0.0
+    for _ in range(max_steps):
+        y = solve(x)
+        estimate = np.sum(np.abs(y))
+        xi = np.where(y >= 0, 1.0, -1.0)
+        z = solve_transpose(xi)
+        j = int(np.argmax(np.abs(z)))
+        # No ascent direction left - a local maximum of ||A(-1)x||1
+        if abs(z[j]) <= z @ x:
+            break
+        x = np.zeros(n)
+        x[j] = 1.0
+    # Higham's extra test vector guards against the local maximum being far off
+    if n > 1:
+        alternating = np.array([(-1) ** i * (1 + i / (n - 1)) for i in range(n)])
+        estimate = max(estimate, 2 * np.sum(np.abs(solve(alternating))) / (3 * n))
+    return float(estimate)
+
+
+def _matrix_norm(matrix, norm):
+    # 1-norm: max column sum, inf-norm: max row sum
+    return float(np.max(np.sum(np.abs(matrix), axis=0 if norm == 1 else 1), initial=0))
+
+
+def CondEstimate(matrix, norm=1, factors=None):
+    """
+    Condition number estimate from an LU factorization in O(n^2), without forming the inverse
+    :param matrix: Matrix nxn
+    :param norm: 1 for the 1-norm, np.inf for the inf-norm (max row sum, as MaxNorm)
+    :param factors: Optional result of LUFactor(matrix), to reuse an existing factorization
+    :return: Estimate of ||A|| * ||A(-1)||, inf for a singular matrix
+    """
+    if norm not in (1, np.inf):
+        raise ValueError(f"Unsupported norm {norm!r}, use 1 or np.inf.")
+    matrix = as_array(matrix, dtype=float)
+    if factors is None:
+        factors = LUFactor(matrix)
+    return _lu_cond_estimate(factors, _matrix_norm(matrix, norm), norm, IsSingularLU(factors))
+
+
+def _lu_cond_estimate(factors, matrix_norm, norm, singular):
+    """
+    Condition estimate from LU factors, shared by CondEstimate and LUFactorization
+    :param factors: (lu, piv, sign, scale) from LUFactor
+    :param matrix_norm: ||A|| in the requested norm
+    :param norm: 1 or np.inf
+    :param singular: Whether the factors have a zero pivot
+    :return: matrix_norm * estimate of ||A(-1)||, inf for a singular matrix
+    """
+    if norm not in (1, np.inf):
+        raise ValueError(f"Unsupported norm {norm!r}, use 1 or np.inf.")
+    if singular:
+        return np.inf
+    solve = lambda b: LUSolve(factors, b)
+    solve_transpose = lambda b: LUSolveTranspose(factors, b)
+    if norm == np.inf:
+        # ||A(-1)||inf = ||A(-T)||1, so the roles of the two solves are exchanged
+        solve, solve_transpose = solve_transpose, solve
+    return matrix_norm * _inverse_norm1_estimate(solve, solve_transpose, len(factors[0]))
+
+
+class LUFactorization:
+    """
+    Factor once, solve many: partial-pivot LU factorization PA = LU, with L and U
+    packed in one array and the row permutation in a pivot vector
+    """
+
+    def __init__(self, matrix):
+        """
+        :param matrix: Matrix nxn (list of lists or numpy array)
+        """
+        matrix = np.asarray(matrix, dtype=float)
+        self.n = len(matrix)
+        self.lu, self.piv, self.sign, self.scale = LUFactor(matrix)
+        # ||A||1 and ||A||inf are kept for the condition estimate, the matrix itself is not stored
+        self.norm1 = _matrix_norm(matrix, 1)
+        self.norm_inf = _matrix_norm(matrix, np.inf)
+        # The factors never change, so the pivots are checked once rather than on every solve
+        self.singular = IsSingularLU(self.factors)
+
+    @property
+    def factors(self):
+        return self.lu, self.piv, self.sign, self.scale
+
+    def is_singular(self):
+        return self.singular
+
+    def solve(self, b):
+        """
+        Solve Ax=b by substitution, O(n^2) per right-hand side
+        :param b: Vector n, or n x k matrix whose columns are right-hand sides
+        :return: Solution in the shape of b
+        """
+        if self.singular:
+            raise np.linalg.LinAlgError("Singular Matrix")
+        return LUSolve(self.factors, b)
+
+    def solve_transpose(self, b):
+        """
+        Solve (A^T)x=b by substitution, O(n^2) per right-hand side
+        :param b: Vector n, or n x k matrix whose columns are right-hand sides
+        :return: Solution in the shape of b
+        """
+        if self.singular:
+            raise np.linalg.LinAlgError("Singular Matrix")
+        return LUSolveTranspose(self.factors, b)
+
+    def det(self):
+        return LUDeterminant(None, self.factors)
+
+    def slogdet(self):
+        return SignLogDet(None, self.factors)
+
+    def cond_estimate(self, norm=1):
+        """
+        Estimate of the condition number ||A|| * ||A(-1)|| from the stored factors, O(n^2)
+        :param norm: 1 for the 1-norm, np.inf for the inf-norm (max row sum, as MaxNorm)
+        :return: Condition estimate (inf for a singular matrix)
+        """
+        return _lu_cond_estimate(self.factors, self.norm_inf if norm == np.inf else self.norm1, norm, self.singular)
+
+
+def Determinant(matrix, mul):
+    """
+    Determinant calculation
+    :param matrix: Matrix nxn
+    :param mul: The double number
+    :return: mul * determinant of matrix
+    """
+    return mul * LUDeterminant(matrix)
+
 # Partial Pivoting: Find the pivot row with the largest absolute value in the current column
 def partial_pivoting(A,i,N):
     pivot_row = i
@@ -181,10 +698,9 @@ def partial_pivoting(A,i,N):
     # Swap the current row with the pivot row
     if pivot_row != i:
         e_matrix = swap_rows_elementary_matrix(N, i, pivot_row)
-        print(f"elementary matrix for swap between row {i} to row {pivot_row} :\n {e_matrix} \n")
         A = np.dot(e_matrix, A)
-        print(f"The matrix after elementary operation :\n {A}")
-        print("------------------------------------------------------------------")
+        if Trace.enabled:
+            _trace_row_operation(f"swap between row {i} to row {pivot_row}", e_matrix, A, step=i)
 def MultiplyMatrix(matrixA, matrixB):
     """
     Function for multiplying 2 matrices
@@ -192,20 +708,12 @@ def MultiplyMatrix(matrixA, matrixB):
     :param matrixB: Matrix nxn
     :return: Multiplication between 2 matrices
     """
-    # result matrix initialized as singularity matrix
-    result = [[0 for y in range(len(matrixB[0]))] for x in range(len(matrixA))]
-    for i in range(len(matrixA)):
-        # iterate through columns of Y
-        for j in range(len(matrixB[0])):
-            # iterate through rows of Y
-            for k in range(len(matrixB)):
-                result[i][j] += matrixA[i][k] * matrixB[k][j]
-    return result
+    return matrix_multiply(matrixA, matrixB)
 
 
 def MakeIMatrix(cols, rows):
     # Initialize a identity matrix
-    return [[1 if x == y else 0 for y in range(cols)] for x in range(rows)]
+    return np.eye(rows, cols)
 def MulMatrixVector(InversedMat, b_vector):
     """
     Function for multiplying a vector matrix
@@ -213,16 +721,8 @@ def MulMatrixVector(InversedMat, b_vector):
     :param b_vector: Vector n
     :return: Result vector
     """
-    result = []
-    # Initialize the x vector
-    for i in range(len(b_vector)):
-        result.append([])
-        result[i].append(0)
-    # Multiplication of inverse matrix in the result vector
-    for i in range(len(InversedMat)):
-        for k in range(len(b_vector)):
-            result[i][0] += InversedMat[i][k] * b_vector[k][0]
-    return result
+    # A column vector [[b0], [b1], ...] gives a column result
+    return as_array(InversedMat) @ as_array(b_vector)
 
 def RowXchageZero(matrix,vector):
     """
@@ -236,65 +736,111 @@ def RowXchageZero(matrix,vector):
         for j in range(i, len(matrix)):
             # The pivot member is not zero
             if matrix[i][i] == 0:
-                temp = matrix[j]
-                temp_b = vector[j]
-                matrix[j] = matrix[i]
-                vector[j] = vector[i]
-                matrix[i] = temp
-                vector[i] = temp_b
+                _swap(matrix, i, j)
+                _swap(vector, i, j)
 
     return [matrix, vector]
 
-def Cond(matrix, invert):
+def Cond(matrix, invert=None):
     """
     :param matrix: Matrix nxn
-    :param invert: Inverted matrix
+    :param invert: Inverted matrix, if omitted ||A(-1)|| is estimated from an LU factorization (CondEstimate)
     :return: CondA = ||A|| * ||A(-1)||
     """
-    print("|| A ||max = ", MaxNorm(matrix))
-    print("|| A(-1) ||max = ", MaxNorm(invert))
-    return MaxNorm(matrix)*MaxNorm(invert)
-
-def InverseMatrix(matrix,vector):
+    if invert is None:
+        return CondEstimate(matrix, np.inf)
+    norm, norm_invert = MaxNorm(matrix), MaxNorm(invert)
+    if Trace.enabled:
+        Trace.emit("MatrixUtility", "norm", f"|| A ||max =  {norm}\n|| A(-1) ||max =  {norm_invert}",
+                   norm=norm, norm_invert=norm_invert)
+    return norm * norm_invert
+
+def InverseMatrix(matrix, vector=None, trace=False):
     """
-    Function for calculating an inverse matrix
+    Function for calculating an inverse matrix by Gauss-Jordan elimination,
+    the row operations are applied directly to the array without elementary matrices
     :param matrix:  Matrix nxn
+    :param vector: Not used, kept for backward compatibility
+    :param trace: Eliminate on [A | I] and trace the elementary matrix of every row operation,
+                  printed unless tracing is already enabled with another sink
     :return: Inverse matrix
     """
-    # Unveri reversible matrix
-    if Determinant(matrix, 1) == 0:
-        print("Error,Singular Matrix\n")
-        return
-    # result matrix initialized as singularity matrix
-    result = MakeIMatrix(len(matrix), len(matrix))
-    # loop for each row
-    for i in range(len(matrix[0])):
-        # turn the pivot into 1 (make elementary matrix and multiply with the result matrix )
-        # pivoting process
-        matrix, vector = RowXchange(matrix, vector)
-        elementary = MakeIMatrix(len(matrix[0]), len(matrix))
-        elementary[i][i] = 1/matrix[i][i]
-        result = MultiplyMatrix(elementary, result)
-        matrix = MultiplyMatrix(elementary, matrix)
-        # make elementary loop to iterate for each row and subtracrt the number below (specific) pivot to zero  (make
-        # elementary matrix and multiply with the result matrix )
-        for j in range(i+1, len(matrix)):
-            elementary = MakeIMatrix(len(matrix[0]), len(matrix))
-            elementary[j][i] = -(matrix[j][i])
-            matrix = MultiplyMatrix(elementary, matrix)
-            result = MultiplyMatrix(elementary, result)
-
-
-    # after finishing with the lower part of the matrix subtract the numbers above the pivot with elementary for loop
-    # (make elementary matrix and multiply with the result matrix )
-    for i in range(len(matrix[0])-1, 0, -1):
-        for j in range(i-1, -1, -1):
-            elementary = MakeIMatrix(len(matrix[0]), len(matrix))
-            elementary[j][i] = -(matrix[j][i])
-            matrix = MultiplyMatrix(elementary, matrix)
-            result = MultiplyMatrix(elementary, result)
-
-    return result
+    if trace:
+        if Trace.enabled:
+            return _traced_inverse(matrix)
+        with Trace.tracing():
+            return _traced_inverse(matrix)
+    n = len(matrix)
+    # The inverse is built in place - column i of A is replaced by column i of the inverse
+    inverse = np.array(matrix, dtype=float)
+    # A pivot below round-off level of its original row means the matrix is singular
+    scale = RowScale(inverse)
+    # Every rank-1 update is written into the same n x n buffer instead of a fresh outer product
+    update = np.empty_like(inverse)
+    swaps = []
+    for i in range(n):
+        # pivoting process - the largest absolute value in the column
+        pivot_row = i + int(np.argmax(np.abs(inverse[i:, i])))
+        pivot = inverse[pivot_row, i]
+        if SingularPivot(pivot, scale[pivot_row], n):
+            if Trace.enabled:
+                Trace.emit("MatrixUtility", "singular", "Error,Singular Matrix\n", step=i)
+            return
+        if pivot_row != i:
+            inverse[[i, pivot_row]] = inverse[[pivot_row, i]]
+            scale[[i, pivot_row]] = scale[[pivot_row, i]]
+            swaps.append((i, pivot_row))
+        # turn the pivot into 1
+        inverse[i, i] = 1.0
+        inverse[i] /= pivot
+        # zero the column above and below the pivot with one rank-1 update
+        factors = inverse[:, i].copy()
+        factors[i] = 0.0
+        inverse[:, i] = 0.0
+        inverse[i, i] = 1.0 / pivot
+        np.multiply(factors[:, None], inverse[i], out=update)
+        inverse -= update
+
+    # The row swaps of A become column swaps of the inverse, undone in reverse order
+    for i, j in reversed(swaps):
+        inverse[:, [i, j]] = inverse[:, [j, i]]
+    return inverse
+
+
+def _traced_inverse(matrix):
+    n = len(matrix)
+    augmented = np.hstack((np.array(matrix, dtype=float), np.identity(n)))
+    scale = RowScale(augmented[:, :n])
+    for i in range(n):
+        pivot_row = i + int(np.argmax(np.abs(augmented[i:, i])))
+        if SingularPivot(augmented[pivot_row, i], scale[pivot_row], n):
+            if Trace.enabled:
+                Trace.emit("MatrixUtility", "singular", "Error,Singular Matrix\n", step=i)
+            return
+        if pivot_row != i:
+            augmented[[i, pivot_row]] = augmented[[pivot_row, i]]
+            scale[[i, pivot_row]] = scale[[pivot_row, i]]
+            _trace_row_operation(f"swap between row {i} to row {pivot_row}",
+                                 swap_rows_elementary_matrix(n, i, pivot_row), augmented, i)
+        pivot = augmented[i, i]
+        augmented[i] /= pivot
+        _trace_row_operation(f"multiply row {i} by {1 / pivot}",
+                             scalar_multiplication_elementary_matrix(n, i, 1 / pivot), augmented, i)
+        for j in range(n):
+            if j != i and augmented[j, i] != 0:
+                scalar = -augmented[j, i]
+                augmented[j] += scalar * augmented[i]
+                _trace_row_operation(f"add {scalar} * row {i} to row {j}",
+                                     row_addition_elementary_matrix(n, j, i, scalar), augmented, i)
+    return augmented[:, n:]
+
+
+def _trace_row_operation(description, elementary, augmented, step=None):
+    Trace.emit("MatrixUtility", "row_operation",
+               f"elementary matrix for {description} :\n {elementary} \n\n"
+               f"The matrix after elementary operation :\n {augmented}\n"
+               "------------------------------------------------------------------",
+               step=step, matrix=augmented, elementary=elementary, description=description)
 
 
 def RowXchange(matrix, vector):
@@ -310,12 +856,8 @@ def RowXchange(matrix, vector):
         for j in range(i, len(matrix)):
             # The pivot member is the maximum in each column
             if abs(matrix[j][i]) > max:
-                temp = matrix[j]
-                temp_b = vector[j]
-                matrix[j] = matrix[i]
-                vector[j] = vector[i]
-                matrix[i] = temp
-                vector[i] = temp_b
+                _swap(matrix, i, j)
+                _swap(vector, i, j)
                 max = abs(matrix[i][i])
 
     return [matrix, vector]
\ No newline at end of file
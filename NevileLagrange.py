@@ -1,3 +1,8 @@
+import numpy as np
+
+import Trace
+
+
 def lagrange_interpolation(x_data, y_data, x):
     """
     Lagrange Interpolation
@@ -23,6 +28,78 @@ def lagrange_interpolation(x_data, y_data, x):
     return result
 
 
+class BarycentricInterpolator:
+    """
+    Barycentric Lagrange Interpolation
+
+    The barycentric weights are computed once from the data points in O(n^2), after that every
+    evaluation costs O(n) per point, and adding a data point costs O(n).
+
+    Parameters:
+    x_data (list): List of distinct x-values for data points.
+    y_data (list): List of y-values for data points.
+    """
+
+    def __init__(self, x_data, y_data):
+        self.x_data = np.array(x_data, dtype=float)
+        self.y_data = np.array(y_data, dtype=float)
+        if len(np.unique(self.x_data)) != len(self.x_data):
+            raise ValueError("The x-values of the data points must be distinct.")
+        differences = self.x_data[:, None] - self.x_data[None, :]
+        np.fill_diagonal(differences, 1.0)
+        # The weights are kept as sign and log|w_i| = -sum log|x_i - x_j|, their products overflow
+        # from about 1500 nodes and adding points one at a time can spread them past the float range
+        self._log_weights = -np.sum(np.log(np.abs(differences)), axis=1)
+        self._signs = np.prod(np.sign(differences), axis=1)
+        self._update_weights()
+
+    def add_point(self, x, y):
+        """
+        Adds the data point (x, y) in O(n).
+        """
+        if np.any(self.x_data == x):
+            raise ValueError("The x-values of the data points must be distinct.")
+        differences = self.x_data - x
+        log_differences = np.log(np.abs(differences))
+        self._log_weights = np.append(self._log_weights - log_differences, -np.sum(log_differences))
+        self._signs = np.append(self._signs * np.sign(differences), np.prod(np.sign(-differences)))
+        self._update_weights()
+        self.x_data = np.append(self.x_data, float(x))
+        self.y_data = np.append(self.y_data, float(y))
+
+    def _update_weights(self):
+        # The weights are only defined up to a common factor, the largest one is scaled to 1
+        self.weights = self._signs * np.exp(self._log_weights - np.max(self._log_weights))
+
+    def __call__(self, x, chunk_size=1 << 20):
+        """
+        Evaluates the interpolating polynomial.
+
+        Parameters:
+        x (float or array): The x-values where you want to evaluate the interpolated polynomial.
+        chunk_size (int): Bound on the size of the temporary point x data array.
+
+        Returns:
+        float or array: The interpolated y-values.
+        """
+        x = np.asarray(x, dtype=float)
+        points = x.reshape(-1)
+        result = np.empty(len(points))
+        rows = max(1, chunk_size // max(len(self.x_data), 1))
+        for first in range(0, len(points), rows):
+            chunk = points[first:first + rows]
+            differences = chunk[:, None] - self.x_data[None, :]
+            exact = differences == 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                terms = self.weights / differences
+                values = (terms @ self.y_data) / np.sum(terms, axis=1)
+            # A point on a data point takes its y-value
+            hit = np.any(exact, axis=1)
+            values[hit] = self.y_data[np.argmax(exact[hit], axis=1)]
+            result[first:first + rows] = values
+        return float(result[0]) if x.ndim == 0 else result.reshape(x.shape)
+
+
 def neville(x_data, y_data, x_interpolate):
     """
     Neville's Interpolation
@@ -44,11 +121,77 @@ def neville(x_data, y_data, x_interpolate):
             tableau[i][j] = ((x_interpolate - x_data[i + j]) * tableau[i][j - 1] -
                              (x_interpolate - x_data[i]) * tableau[i + 1][j - 1]) / \
                             (x_data[i] - x_data[i + j])
+    if Trace.enabled:
+        Trace.emit("NevileLagrange", "neville_tableau", f"Neville tableau at x = {x_interpolate}:\n {tableau}",
+                   matrix=tableau, x=x_interpolate)
 
     return tableau[0][n - 1]
 
 
+def neville_vectorized(x_data, y_data, x_interpolate, tolerance=None, chunk_size=1 << 20):
+    """
+    Neville's Interpolation for many points at once
+
+    Every point keeps a single buffer of n values that holds the current column of the tableau,
+    the points are the rows of one array so each column is one vectorized update. The data points are
+    taken nearest first, and the difference between the last two diagonal values is the error estimate.
+
+    Parameters:
+    x_data (list): List of x-values for data points.
+    y_data (list): List of y-values for data points.
+    x_interpolate (float or array): The x-values where you want to evaluate the interpolated polynomial.
+    tolerance (float): If given, a point stops as soon as its error estimate is within the tolerance.
+    chunk_size (int): Bound on the size of the temporary point x data arrays.
+
+    Returns:
+    tuple: (interpolated y-values, error estimates), in the shape of x_interpolate.
+    """
+    x_data = np.asarray(x_data, dtype=float)
+    y_data = np.asarray(y_data, dtype=float)
+    x = np.asarray(x_interpolate, dtype=float)
+    points = x.reshape(-1)
+    n = len(x_data)
+    values = np.empty(len(points))
+    errors = np.empty(len(points))
+    rows = max(1, chunk_size // max(n, 1))
+    for first in range(0, len(points), rows):
+        chunk = points[first:first + rows]
+        values[first:first + rows], errors[first:first + rows] = _neville_rows(x_data, y_data, chunk, tolerance)
+    if x.ndim == 0:
+        return float(values[0]), float(errors[0])
+    return values.reshape(x.shape), errors.reshape(x.shape)
+
+
+def _neville_rows(x_data, y_data, points, tolerance):
+    n = len(x_data)
+    order = np.argsort(np.abs(points[:, None] - x_data[None, :]), axis=1, kind="stable")
+    nodes = x_data[order]
+    column = y_data[order]
+    values = column[:, 0].copy()
+    errors = np.full(len(points), np.inf)
+    # Rows of the points still being refined
+    active = np.arange(len(points))
+    t = points[:, None]
+    for j in range(1, n):
+        m = n - j
+        column[:, :m] = ((t - nodes[:, j:]) * column[:, :m] - (t - nodes[:, :m]) * column[:, 1:m + 1]) / \
+                        (nodes[:, :m] - nodes[:, j:])
+        errors[active] = column[:, 0] - values[active]
+        values[active] = column[:, 0]
+        if Trace.enabled:
+            Trace.emit("NevileLagrange", "neville_column", f"Neville column {j}:\n {column[:, :m]}",
+                       step=j, matrix=column[:, :m], active=len(active))
+        if tolerance is not None:
+            keep = np.abs(errors[active]) > tolerance
+            if not np.all(keep):
+                active, column, nodes, t = active[keep], column[keep], nodes[keep], t[keep]
+                if len(active) == 0:
+                    break
+    return values, errors
+
+
 if __name__ == "__main__":
+    Trace.enable(Trace.print_sink)
     x_data = [1, 2, 3, 4]
     y_data = [1, 4, 9, 16]
     x_point = 2.5
@@ -56,5 +199,11 @@ if __name__ == "__main__":
     lagrange_result = lagrange_interpolation(x_data, y_data, x_point)
     print(f"Lagrange Interpolation Result at x = {x_point}: {lagrange_result}")
 
+    barycentric_result = BarycentricInterpolator(x_data, y_data)(x_point)
+    print(f"Barycentric Lagrange Interpolation Result at x = {x_point}: {barycentric_result}")
+
     neville_result = neville(x_data, y_data, x_point)
     print(f"Neville Interpolation Result at x = {x_point}: {neville_result}")
+
+    neville_result, neville_error = neville_vectorized(x_data, y_data, x_point)
+    print(f"Vectorized Neville Interpolation Result at x = {x_point}: {neville_result} (error estimate {neville_error})")
@@ -1,6 +1,244 @@
 import numpy as np
 
-def spline_cubic(x_list, y_list, x, f_tag_0, f_tag_n):
+import Trace
+from MatrixUtility import tridiagonal_factor, tridiagonal_solve
+
+
+EXTRAPOLATION = ("cubic", "linear", "constant", "nan", "raise")
+
+
+class SplineKnots:
+    """
+    Knots shared by many cubic splines.
+
+    The spacing, the lambda/mu coefficients and the factored tridiagonal system of every boundary condition
+    depend only on the knots, so they are computed once and reused by every spline fitted on them.
+
+    Parameters:
+    x_list (list): Strictly increasing x-values for data points.
+    """
+
+    def __init__(self, x_list):
+        self.x_list = np.asarray(x_list, dtype=float)
+        if len(self.x_list) < 2:
+            raise ValueError("Need at least two data points.")
+        self.h = np.diff(self.x_list)
+        if np.any(self.h <= 0):
+            raise ValueError("The x-values must be strictly increasing.")
+        n = len(self.h)
+        # The system mu_i*M(i-1) + 2*M(i) + lam_i*M(i+1) = d_i
+        self.lam = np.zeros(n + 1)
+        self.mu = np.zeros(n + 1)
+        self.lam[1:n] = self.h[1:] / (self.h[1:] + self.h[:-1])
+        self.mu[1:n] = 1 - self.lam[1:n]
+        self._factors = {}
+        # Knots close enough to an equal spacing that x // step is at most one segment off
+        self._step = (self.x_list[-1] - self.x_list[0]) / n
+        self._uniform = bool(np.max(np.abs(self.x_list - (self.x_list[0] + self._step * np.arange(n + 1))))
+                             <= 0.25 * self._step)
+
+    def __len__(self):
+        return len(self.x_list)
+
+    def factors(self, boundary):
+        """
+        The factored tridiagonal system of a boundary condition, computed on first use.
+        """
+        if boundary not in self._factors:
+            n = len(self.h)
+            lam, mu = self.lam.copy(), self.mu.copy()
+            diagonal = np.full(n + 1, 2.0)
+            if boundary == "natural":
+                diagonal[0] = diagonal[n] = 1.0
+            else:
+                lam[0] = mu[n] = 1.0
+            self._factors[boundary] = tridiagonal_factor(mu, diagonal, lam)
+        return self._factors[boundary]
+
+    def fit(self, y_list, boundary="natural", f_tag_0=None, f_tag_n=None, extrapolate="cubic"):
+        return CubicSpline(self, y_list, boundary, f_tag_0, f_tag_n, extrapolate)
+
+    def segment(self, x):
+        """
+        Index of the segment of every x, by binary search (by direct arithmetic for equally spaced knots).
+        Points outside the knots use the end segments.
+        """
+        last = len(self.h) - 1
+        if not self._uniform:
+            return np.clip(np.searchsorted(self.x_list, x, side="right") - 1, 0, last)
+        i = np.clip(np.floor((x - self.x_list[0]) / self._step).astype(np.intp), 0, last)
+        # Round-off and uneven spacing can land one segment off
+        i = i - ((x < self.x_list[i]) & (i > 0))
+        i = i + ((x >= self.x_list[np.minimum(i + 1, last + 1)]) & (i < last))
+        return i
+
+
+class CubicSpline:
+    """
+    Cubic Spline Interpolation with Natural or Full (clamped) Spline.
+
+    The moments (second derivatives at the knots) are computed once with a tridiagonal solve in O(n),
+    and stored as per-segment polynomial coefficients, so evaluating an array of x-values costs
+    one binary search per point. A 2-D y_list fits one spline per column (channel) on the same knots
+    with a single solve, and evaluation returns every channel at once.
+
+    Parameters:
+    x_list (list or SplineKnots): Strictly increasing x-values for data points.
+    y_list (list): List of y-values for data points, or an array with one column per channel.
+    boundary (str): "natural" (zero second derivative at the ends) or "full" (given first derivatives).
+    f_tag_0 (float): Derivative at the first point (for full spline), one per channel if needed.
+    f_tag_n (float): Derivative at the last point (for full spline), one per channel if needed.
+    extrapolate (str): Outside the knots - "cubic" continues the end segments, "linear" the tangent lines
+                       at the ends, "constant" the end values, "nan" returns nan and "raise" raises ValueError.
+    """
+
+    def __init__(self, x_list, y_list, boundary="natural", f_tag_0=None, f_tag_n=None, extrapolate="cubic"):
+        if boundary not in ("natural", "full"):
+            raise ValueError(f"Unknown boundary condition {boundary!r}, use 'natural' or 'full'.")
+        if extrapolate not in EXTRAPOLATION:
+            raise ValueError(f"Unknown extrapolation {extrapolate!r}, use one of {EXTRAPOLATION}.")
+        self.extrapolate = extrapolate
+        if boundary == "full" and (f_tag_0 is None or f_tag_n is None):
+            raise ValueError("The full spline needs the derivatives f_tag_0 and f_tag_n.")
+        self.knots = x_list if isinstance(x_list, SplineKnots) else SplineKnots(x_list)
+        self.x_list = self.knots.x_list
+        y = np.asarray(y_list, dtype=float)
+        if len(y) != len(self.x_list) or y.ndim > 2:
+            raise ValueError("y_list needs one value (or one row of channels) per x-value.")
+        n = len(self.knots.h)
+        h = self.knots.h if y.ndim == 1 else self.knots.h[:, None]
+        slopes = np.diff(y, axis=0) / h
+
+        d = np.zeros(y.shape)
+        d[1:n] = 6 * (slopes[1:] - slopes[:-1]) / (h[1:] + h[:-1])
+        if boundary == "full":
+            d[0] = 6 * (slopes[0] - np.asarray(f_tag_0, dtype=float)) / h[0]
+            d[n] = 6 * (np.asarray(f_tag_n, dtype=float) - slopes[n - 1]) / h[n - 1]
+        moments = tridiagonal_solve(self.knots.factors(boundary), d)
+        if Trace.enabled:
+            Trace.emit("Splaine", "moments", f"Moments M of the {boundary} spline:\n {moments}",
+                       matrix=moments, boundary=boundary)
+
+        # S(x) = a + b*dx + c*dx^2 + e*dx^3 on [x_i, x_(i+1)], dx = x - x_i
+        self.a = y[:-1]
+        self.b = slopes - h * (moments[1:] + 2 * moments[:-1]) / 6
+        self.c = moments[:-1] / 2
+        self.e = (moments[1:] - moments[:-1]) / (6 * h)
+        self.moments = moments
+        # Integral from the first knot to every segment start, for the antiderivative
+        h = self.knots.h if y.ndim == 1 else self.knots.h[:, None]
+        areas = h * (self.a + h * (self.b / 2 + h * (self.c / 3 + h * self.e / 4)))
+        self._cumulative = np.concatenate((np.zeros((1,) + areas.shape[1:]), np.cumsum(areas, axis=0)[:-1]))
+
+    @property
+    def channels(self):
+        return None if self.a.ndim == 1 else self.a.shape[1]
+
+    def segment(self, x):
+        return self.knots.segment(x)
+
+    def __call__(self, x):
+        """
+        Evaluates the spline.
+
+        Parameters:
+        x (float or array): The x-values to predict.
+
+        Returns:
+        float or array: The spline values, with a trailing axis of channels for a batched spline.
+        """
+        return self._evaluate(x, 0)
+
+    def derivative(self, x, order=1):
+        """
+        Evaluates a derivative of the spline from the segment coefficients.
+
+        Parameters:
+        x (float or array): The x-values.
+        order (int): Order of the derivative, 1 or more.
+
+        Returns:
+        float or array: The derivative values.
+        """
+        if order < 1:
+            raise ValueError("The order of the derivative must be at least 1.")
+        return self._evaluate(x, order)
+
+    def antiderivative(self, x):
+        """
+        The integral of the spline from the first knot to x, computed exactly from the segment coefficients.
+        """
+        return self._evaluate(x, -1)
+
+    def integrate(self, a, b):
+        """
+        Definite integral of the spline from a to b, computed exactly from the segment coefficients.
+
+        Parameters:
+        a (float or array): Lower limits.
+        b (float or array): Upper limits.
+
+        Returns:
+        float or array: The integrals.
+        """
+        return self.antiderivative(b) - self.antiderivative(a)
+
+    def _segment_values(self, i, dx, order):
+        """
+        The order-th derivative (-1 for the antiderivative) of the polynomials of segments i at offsets dx.
+        """
+        a, b, c, e = self.a[i], self.b[i], self.c[i], self.e[i]
+        if order == -1:
+            return self._cumulative[i] + dx * (a + dx * (b / 2 + dx * (c / 3 + dx * e / 4)))
+        if order == 0:
+            return a + dx * (b + dx * (c + dx * e))
+        if order == 1:
+            return b + dx * (2 * c + 3 * dx * e)
+        if order == 2:
+            return 2 * c + 6 * dx * e
+        if order == 3:
+            return 6 * e + 0 * dx
+        return 0 * (a + dx)
+
+    def _evaluate(self, x, order):
+        x = np.asarray(x, dtype=float)
+        i = self.segment(x)
+        dx = x - self.x_list[i]
+        if self.a.ndim == 2:
+            dx = dx[..., None]
+        result = self._segment_values(i, dx, order)
+        if self.extrapolate != "cubic":
+            result = np.array(result)
+            last = len(self.a) - 1
+            for outside, segment, end in ((x < self.x_list[0], 0, self.x_list[0]),
+                                          (x > self.x_list[-1], last, self.x_list[-1])):
+                if not np.any(outside):
+                    continue
+                if self.extrapolate == "raise":
+                    raise ValueError(f"x-values outside [{self.x_list[0]}, {self.x_list[-1]}].")
+                result[outside] = self._extension(x[outside] - end, segment, end - self.x_list[segment], order)
+        return float(result) if result.ndim == 0 else result
+
+    def _extension(self, t, segment, offset, order):
+        """
+        The order-th derivative of the extension outside the knots, t is the distance from the end knot.
+        """
+        if self.a.ndim == 2:
+            t = t[:, None]
+        if self.extrapolate == "nan":
+            return np.full(t.shape[:1] + self.a.shape[1:], np.nan)
+        value = self._segment_values(segment, offset, 0)
+        slope = self._segment_values(segment, offset, 1) if self.extrapolate == "linear" else 0 * value
+        if order == -1:
+            return self._segment_values(segment, offset, -1) + t * (value + t * slope / 2)
+        if order == 0:
+            return value + t * slope
+        if order == 1:
+            return slope + 0 * t
+        return 0 * (value + t)
+
+
+def spline_cubic(x_list, y_list, x, f_tag_0, f_tag_n, extrapolate="cubic"):
     """
     Cubic Spline Interpolation with Natural and Full Spline.
 
@@ -10,67 +248,18 @@ def spline_cubic(x_list, y_list, x, f_tag_0, f_tag_n):
     x (float): The x-value to predict.
     f_tag_0 (float): Derivative at the first point (for full spline).
     f_tag_n (float): Derivative at the last point (for full spline).
+    extrapolate (str): Behaviour outside x_list, see CubicSpline.
 
     Returns:
     tuple: (natural_spline_result, full_spline_result)
     """
-    n = len(x_list) - 1
-    h_list = [x_list[i+1] - x_list[i] for i in range(n)]
-
-    # Step 1: Build lambda, mu, and d for the natural spline
-    lam_list = [h_list[i] / (h_list[i] + h_list[i-1]) if i > 0 else 0 for i in range(n)]
-    mu_list = [1 - lam_list[i] if i > 0 else 0 for i in range(n)]
-    d_list = [0] * (n + 1)
-    for i in range(1, n):
-        d_list[i] = 6 * ((y_list[i+1] - y_list[i]) / h_list[i] -
-                         (y_list[i] - y_list[i-1]) / h_list[i-1]) / (h_list[i] + h_list[i-1])
-
-    # Step 2: Solve the system of equations for natural spline
-    matrix = np.zeros((n+1, n+1))
-    for i in range(1, n):
-        matrix[i][i-1] = mu_list[i]
-        matrix[i][i] = 2
-        matrix[i][i+1] = lam_list[i]
-    matrix[0][0] = 1
-    matrix[n][n] = 1
-    m_natural = np.linalg.solve(matrix, d_list)
-
-    # Step 3: Calculate the result for the natural spline
-    for i in range(n):
-        if x_list[i] <= x <= x_list[i+1]:
-            dx = x - x_list[i]
-            result_natural = (y_list[i] +
-                              (m_natural[i] / 2) * dx**2 +
-                              ((m_natural[i+1] - m_natural[i]) / (6 * h_list[i])) * dx**3 +
-                              ((y_list[i+1] - y_list[i]) / h_list[i] - (h_list[i] / 6) *
-                               (m_natural[i+1] + 2 * m_natural[i])) * dx)
-            break
-
-    # Step 4: Build the matrix and vector for the full spline
-    d_list[0] = 6 * ((y_list[1] - y_list[0]) / h_list[0] - f_tag_0) / h_list[0]
-    d_list[n] = 6 * (f_tag_n - (y_list[n] - y_list[n-1]) / h_list[n-1]) / h_list[n-1]
-
-    matrix[0][0] = 2
-    matrix[0][1] = 1
-    matrix[n][n-1] = 1
-    matrix[n][n] = 2
-    m_full = np.linalg.solve(matrix, d_list)
-
-    # Step 5: Calculate the result for the full spline
-    for i in range(n):
-        if x_list[i] <= x <= x_list[i+1]:
-            dx = x - x_list[i]
-            result_full = (y_list[i] +
-                           (m_full[i] / 2) * dx**2 +
-                           ((m_full[i+1] - m_full[i]) / (6 * h_list[i])) * dx**3 +
-                           ((y_list[i+1] - y_list[i]) / h_list[i] - (h_list[i] / 6) *
-                            (m_full[i+1] + 2 * m_full[i])) * dx)
-            break
-
-    return result_natural, result_full
+    natural = CubicSpline(x_list, y_list, "natural", extrapolate=extrapolate)
+    full = CubicSpline(x_list, y_list, "full", f_tag_0, f_tag_n, extrapolate)
+    return natural(x), full(x)
 
 
 if __name__ == "__main__":
+    Trace.enable(Trace.print_sink)
     x_list = [0, 1, 2, 3]
     y_list = [1, 2, 0, 2]
     x = 1.5
@@ -0,0 +1,93 @@
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+# Checked by the callers before building an event, so tracing costs one attribute lookup when off
+enabled = False
+_sink = None
+
+TraceEvent = namedtuple("TraceEvent", ["module", "operation", "step", "message", "matrix", "data"])
+
+
+def print_sink(event):
+    """
+    Sink that prints the message of the event, or its matrix snapshot for events without a message
+    :param event: TraceEvent
+    """
+    if event.message is not None:
+        print(event.message)
+    elif event.matrix is not None:
+        print(event.matrix)
+
+
+class ListSink:
+    """
+    Sink that collects the events in a list, for inspection after a run
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def __len__(self):
+        return len(self.events)
+
+    def clear(self):
+        self.events.clear()
+
+
+def enable(sink=print_sink):
+    """
+    Turns tracing on
+    :param sink: Callable that receives every TraceEvent
+    """
+    global enabled, _sink
+    _sink = sink
+    enabled = sink is not None
+
+
+def disable():
+    """
+    Turns tracing off
+    """
+    global enabled, _sink
+    enabled = False
+    _sink = None
+
+
+@contextmanager
+def tracing(sink=print_sink):
+    """
+    Enables tracing inside a with block and restores the previous state afterwards
+    :param sink: Callable that receives every TraceEvent
+    :return: The sink
+    """
+    previous = enabled, _sink
+    enable(sink)
+    try:
+        yield sink
+    finally:
+        enable(previous[1]) if previous[0] else disable()
+
+
+def emit(module, operation, message=None, step=None, matrix=None, **data):
+    """
+    Sends an event to the sink, a no-op while tracing is off
+    :param module: Name of the module emitting the event
+    :param operation: Short name of the operation, e.g. "row_swap"
+    :param message: Human readable text, printed by print_sink
+    :param step: Step or iteration number, if any
+    :param matrix: Matrix or vector, a copy is stored so later in-place changes don't alter it
+    :param data: Any further values of the event
+    """
+    if not enabled:
+        return
+    if matrix is not None:
+        matrix = np.array(matrix, copy=True)
+    _sink(TraceEvent(module, operation, step, message, matrix, data))